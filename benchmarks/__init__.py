@@ -0,0 +1,51 @@
+"""Benchmarks for quotr.
+
+Each module is runnable on its own, e.g. ``python -m benchmarks.search``, and
+runs against a throwaway test database created from the configured one.
+"""
+import contextlib
+import os
+import statistics
+import time
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quotr.settings')
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database():
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat=20):
+    """Call `func` `repeat` times and return the timings in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings, **extra):
+    columns = [
+        f'{name:<40}',
+        f'median {statistics.median(timings):9.3f} ms',
+        f'min {min(timings):9.3f} ms',
+        f'max {max(timings):9.3f} ms',
+    ]
+    columns += [f'{key} {value}' for key, value in extra.items()]
+    print('  '.join(columns))
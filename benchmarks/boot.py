@@ -0,0 +1,79 @@
+"""Measure how long a gunicorn worker takes to become ready to serve.
+
+    python -m benchmarks.boot [--repeat N] [--workers N]
+
+Starts gunicorn with gunicorn.conf.py, with and without preload_app, and
+collects the boot time every worker logs, from post_fork to
+post_worker_init. Without preloading that includes importing the WSGI
+application and the URLconf; with it they were imported once in the master
+before forking. Needs gunicorn, so run it where requirements.txt is
+installed.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+from . import report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOOTED = re.compile(r'Worker \d+ booted in ([\d.]+) ms')
+
+
+def boot_times(workers, **env):
+    """Start gunicorn, wait for its `workers` to boot and return their boot
+    times, or None and the last line of output if it didn't get there."""
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'quotr.wsgi', '--config', 'gunicorn.conf.py',
+         '--workers', str(workers), '--bind', '127.0.0.1:0'],
+        cwd=ROOT, env=dict(os.environ, **env),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True,
+    )
+    timings = []
+    line = ''
+    try:
+        # gunicorn exits, closing its output, when it can't boot a worker
+        for line in server.stderr:
+            match = BOOTED.search(line)
+            if match:
+                timings.append(float(match.group(1)))
+                if len(timings) == workers:
+                    return timings, None
+    finally:
+        server.terminate()
+        server.wait()
+    return None, line.strip() or f"gunicorn exited with {server.returncode}"
+
+
+def run(repeat, workers, **env):
+    timings = []
+    for _ in range(repeat):
+        times, error = boot_times(workers, **env)
+        if times is None:
+            return None, error
+        timings += times
+    return timings, None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5, help="times to start gunicorn")
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    cases = [
+        ('worker boot, no preload', {'GUNICORN_PRELOAD': '0', 'DJANGO_HEROKU': '0'}),
+        ('worker boot, no preload, django_heroku', {'GUNICORN_PRELOAD': '0', 'DJANGO_HEROKU': '1'}),
+        ('worker boot, preload', {'GUNICORN_PRELOAD': '1', 'DJANGO_HEROKU': '0'}),
+    ]
+    for name, env in cases:
+        timings, error = run(args.repeat, args.workers, **env)
+        if timings is None:
+            print(f'{name:<40}  skipped: {error}')
+        else:
+            report(name, timings)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Per-request latency and database connections opened by the web tier, with
+and without connection reuse.
+
+    python -m benchmarks.connections [--threads N] [--requests N]
+
+Serves the quote list through the WSGI handler from several threads, like a
+threaded gunicorn worker, so connections are closed or handed back at the end
+of every request as they are in production. Every mode runs in its own
+process, as the settings only read DATABASE_POOL and DATABASE_CONN_MAX_AGE
+once. Needs PostgreSQL. Against a local server the difference in latency is
+smaller than against a remote one that needs TLS.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from . import report, setup, test_database
+from .search import populate
+
+MODES = {
+    'no reuse': {'DATABASE_POOL': '0', 'DATABASE_CONN_MAX_AGE': '0'},
+    'persistent (CONN_MAX_AGE=600)': {'DATABASE_POOL': '0', 'DATABASE_CONN_MAX_AGE': '600'},
+    'pool': {'DATABASE_POOL': '1'},
+}
+
+
+def serve(args):
+    setup()
+    import psycopg2
+    from django.contrib.auth import get_user_model
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection
+    from django.test import Client, RequestFactory
+    from django.urls import reverse
+
+    with test_database():
+        if connection.vendor != 'postgresql':
+            sys.exit("This benchmark needs PostgreSQL.")
+        populate(200, users=args.threads)
+        cookies = []
+        for user in get_user_model().objects.order_by('id'):
+            client = Client()
+            client.force_login(user)
+            cookies.append(f"sessionid={client.cookies['sessionid'].value}")
+        url = reverse('quotes:list-quote')
+        connection.close()
+
+        opened = []
+        connect = psycopg2.connect
+
+        def counting_connect(*args, **kwargs):
+            opened.append(1)
+            return connect(*args, **kwargs)
+
+        psycopg2.connect = counting_connect
+        handler = WSGIHandler()
+        timings = []
+
+        def worker(cookie):
+            for _ in range(args.requests):
+                environ = RequestFactory().get(url, HTTP_COOKIE=cookie).environ
+                start = time.perf_counter()
+                response = handler(environ, lambda status, headers: None)
+                b''.join(response)
+                response.close()
+                timings.append((time.perf_counter() - start) * 1000)
+
+        threads = [threading.Thread(target=worker, args=(cookie,)) for cookie in cookies]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        psycopg2.connect = connect
+
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        report(args.mode, timings, p95=f'{p95:.3f} ms', requests=len(timings), connections=len(opened))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50, help="requests per thread")
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        serve(args)
+        return
+
+    for mode, env in MODES.items():
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.connections', '--mode', mode,
+             '--threads', str(args.threads), '--requests', str(args.requests)],
+            env=dict(os.environ, **env),
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Compare loading the next page of quotes and books as a card fragment with
+navigating to the full page.
+
+    python -m benchmarks.fragments [--pages N]
+"""
+import argparse
+
+from . import measure, report, setup, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=10, help="pages of quotes and books to generate")
+    args = parser.parse_args()
+
+    setup()
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from django.urls import reverse
+    from quotes.models import Author, Book, Quote
+
+    with test_database():
+        user = get_user_model().objects.create(username='reader')
+        authors = [Author.objects.resolve(f"Author {i}", user) for i in range(7)]
+        Book.objects.bulk_create(
+            Book(title=f"Title {i}", author=authors[i % 7], created_by=user) for i in range(args.pages * 20)
+        )
+        books = list(user.books.all())
+        Quote.objects.bulk_create(
+            Quote(book=books[i % len(books)], text=f"Quote number {i} " * 10, created_by=user) for i in range(args.pages * 20)
+        )
+
+        client = Client()
+        client.force_login(user)
+        for name in ('quotes:list-quote', 'quotes:list-book'):
+            for mode, suffix in (('full', ''), ('fragment', '&fragment=1')):
+                url = f"{reverse(name)}?page=2{suffix}"
+                size = len(client.get(url).content)
+                report(f'{name} {mode}', measure(lambda: client.get(url)), bytes=size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Per-user quote list and search latency before and after hash partitioning
+the quotes table.
+
+    python -m benchmarks.partitioning [--users N] [--quotes N] [--partitions N]
+
+Needs PostgreSQL 13 or later, like quotes.partitioning.
+"""
+import argparse
+
+from . import measure, report, setup, test_database
+from .search import populate
+
+QUERIES = ["river", "winter light"]
+
+
+def run(label, users):
+    from django.db import connection
+    from quotes.models import Quote
+    from quotes.search.postgres import PostgresSearchBackend
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE quotes_quote')
+    backend = PostgresSearchBackend()
+    for name, func in [
+        ('list', lambda quotes: list(quotes.select_related('book__author').order_by('-modified', '-id')[:20])),
+        *((f'search "{query}"', lambda quotes, query=query: list(backend.search(quotes, query)[:20])) for query in QUERIES),
+    ]:
+        timings = []
+        for user in users:
+            timings += measure(lambda: func(Quote.objects.filter(created_by=user)), repeat=5)
+        report(f'{label} {name}', timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--quotes', type=int, default=2000, help="quotes per user")
+    parser.add_argument('--partitions', type=int, default=16)
+    args = parser.parse_args()
+
+    setup()
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from quotes import partitioning
+    from quotes.models import Quote
+
+    with test_database():
+        if connection.vendor != 'postgresql':
+            parser.exit(1, "This benchmark needs PostgreSQL.\n")
+        if partitioning.partition_count(connection):
+            partitioning.convert(connection, 0)
+
+        populate(args.quotes, users=args.users)
+        users = list(get_user_model().objects.order_by('?')[:10])
+        print(f"{Quote.objects.count()} quotes of {args.users} users")
+
+        run('plain', users)
+        partitioning.convert(connection, args.partitions)
+        run(f'{args.partitions} partitions', users)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Compare the quote search backends on a generated library.
+
+    python -m benchmarks.search [--quotes N]
+
+Backends that cannot run on the configured database are skipped.
+"""
+import argparse
+import random
+
+from . import measure, report, setup, test_database
+
+WORDS = (
+    "time river light house memory stone garden letter silence winter "
+    "mountain promise shadow window morning journey voice story ocean fire"
+).split()
+
+QUERIES = [
+    "river", "winter light", "memory stone garden", "Author 3", "Title 12",
+    '"winter light"', "winter -light", "river OR ocean", "gard",
+]
+
+
+def populate(quotes_per_user, users=5, books_per_user=20):
+    from django.contrib.auth import get_user_model
+    from quotes.models import Author, Book, Quote
+
+    rng = random.Random(42)
+    for u in range(users):
+        user = get_user_model().objects.create(username=f'reader{u}')
+        authors = [Author.objects.resolve(f"Author {a}", user) for a in range(7)]
+        books = Book.objects.bulk_create(
+            Book(title=f"Title {b}", author=authors[b % 7], created_by=user) for b in range(books_per_user)
+        )
+        if not books[0].pk:
+            books = list(user.books.all())
+        Quote.objects.bulk_create(
+            (Quote(
+                book=rng.choice(books),
+                text=' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))),
+                created_by=user,
+            ) for _ in range(quotes_per_user))
+        )
+    return get_user_model().objects.get(username='reader0')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quotes', type=int, default=2000, help="quotes per user")
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from quotes.models import Quote
+    from quotes.search.memory import InMemorySearchBackend
+    from quotes.search.postgres import PostgresSearchBackend
+    from quotes.search.sqlite import SQLiteSearchBackend
+
+    backends = {'memory': InMemorySearchBackend}
+    with test_database():
+        if connection.vendor == 'postgresql':
+            backends['postgres'] = PostgresSearchBackend
+        if connection.vendor == 'sqlite':
+            backends['sqlite-fts5'] = SQLiteSearchBackend
+
+        user = populate(args.quotes)
+        print(f"{connection.vendor}, {Quote.objects.count()} quotes")
+        for name, backend_class in backends.items():
+            backend = backend_class()
+            # warm up, which also builds the in-memory index
+            list(backend.search(Quote.objects.none(), QUERIES[0]))
+            for query in QUERIES:
+                quotes = Quote.objects.filter(created_by=user)
+                timings = measure(lambda: list(backend.search(quotes, query)[:20]))
+                report(f'{name} "{query}"', timings, matches=backend.search(quotes, query).count())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+# Gunicorn configuration, see Procfile and the Deployment section of the README.
+import os
+import time
+
+# Import Django and the project once in the master process and fork workers
+# from it, instead of every worker importing everything on its own. Set
+# GUNICORN_PRELOAD=0 to go back to loading the app in each worker, e.g. to
+# pick up code changes on a HUP without a full restart.
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+
+def post_fork(server, worker):
+    worker.boot_started = time.perf_counter()
+
+
+def post_worker_init(worker):
+    boot_time = (time.perf_counter() - worker.boot_started) * 1000
+    worker.log.info("Worker %s booted in %.1f ms (preload %s)", worker.pid, boot_time, 'on' if preload_app else 'off')
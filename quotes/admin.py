@@ -1,3 +1,59 @@
+import json
+
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+
+from .middleware import format_stats
+from .models import RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created', 'method', 'path', 'status_code', 'duration', 'query_count', 'query_duration', 'created_by', 'download_link')
+    list_filter = ('method', 'status_code')
+    search_fields = ('path',)
+    exclude = ('queries', 'stats')
+    readonly_fields = (
+        'path', 'method', 'status_code', 'duration', 'query_count', 'query_duration',
+        'created', 'created_by', 'download_link', 'profile_summary', 'sql_queries',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download), name='quotes_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download(self, request, pk):
+        # admin_view only checks for staff, the changelist needs view permission too
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(bytes(profile.stats), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="request-{profile.pk}.prof"'
+        return response
+
+    def download_link(self, obj):
+        return format_html('<a href="{}">{}</a>', reverse('admin:quotes_requestprofile_download', args=(obj.pk,)), "Download .prof")
+    download_link.short_description = "Profile"
+
+    def profile_summary(self, obj):
+        return format_html('<pre>{}</pre>', format_stats(obj))
+    profile_summary.short_description = "Slowest functions"
 
-# Register your models here.
+    def sql_queries(self, obj):
+        queries = json.loads(obj.queries)
+        rows = format_html_join('', '<tr><td>{}&nbsp;ms</td><td><code>{}</code><br><small>{}</small></td></tr>', (
+            (f"{query['duration']:.2f}", query['sql'], query['params']) for query in queries
+        ))
+        return format_html('<table>{}</table>', rows)
+    sql_queries.short_description = "SQL"
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class QuotesConfig(AppConfig):
     name = 'quotes'
+
+    def ready(self):
+        # connect the signal receivers that keep derived data up to date
+        from . import stats  # noqa: F401
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Quote
+from .signals import ROW_FIELDS, quotes_moved
+
+
+def move_quotes(quotes, book):
+    """Move every quote in `quotes` to `book` with a single UPDATE and return
+    how many were moved. Only quotes owned by the book's owner are moved."""
+    quotes = quotes.filter(created_by=book.created_by_id).exclude(book=book)
+    with transaction.atomic():
+        rows = list(quotes.select_for_update().values(*ROW_FIELDS))
+        if not rows:
+            return 0
+        moved = quotes.filter(pk__in=[row['id'] for row in rows]).update(book=book, modified=timezone.now())
+        quotes_moved.send(sender=Quote, rows=rows, book=book)
+    return moved
+
+
+def delete_quotes(quotes):
+    """Delete every quote in `quotes` with a single DELETE and return how many
+    were deleted."""
+    # QuoteQuerySet.delete() sends quotes_deleted
+    deleted, _ = quotes.delete()
+    return deleted
@@ -0,0 +1,156 @@
+"""Weekly "your quotes" digests, sent by `manage.py send_digests`.
+
+Users are walked in chunks of ids. For each chunk a handful of queries claim
+the digests, pick the quotes of every user in it and mark the digests as sent
+afterwards, so the number of queries depends on the number of chunks rather
+than on the number of users. Several runs can work at the same time, either
+on shards of the users or on all of them, as every digest is claimed by
+exactly one run before it is sent.
+"""
+import datetime
+import uuid
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connections
+from django.db.models import F, Window
+from django.db.models.functions import Mod, RowNumber
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import DigestDelivery, Quote
+
+User = get_user_model()
+
+RANDOM_COUNT = 3
+RECENT_COUNT = 5
+CHUNK_SIZE = 200
+# digests claimed by a run that died before sending them are taken over after this long
+CLAIM_TIMEOUT = datetime.timedelta(hours=1)
+# multiplicative hashing of quote ids, see _shuffled(). The multipliers are
+# beyond the range of integer, so PostgreSQL multiplies as bigint.
+HASH_MULTIPLIER = 2654435761
+HASH_USER_MULTIPLIER = 2246822519
+HASH_MODULUS = 4294967291
+
+
+def period_of(day):
+    """The Monday starting the week of `day`."""
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def user_chunks(chunk_size=CHUNK_SIZE, shard=None):
+    """Active users with an email address in lists of `chunk_size`, ordered by
+    id. With `shard` as (index, count) only the users with id % count == index."""
+    users = User.objects.filter(is_active=True).exclude(email='').order_by('id')
+    if shard:
+        index, count = shard
+        users = users.annotate(shard=Mod('id', count)).filter(shard=index)
+
+    last_id = 0
+    while True:
+        chunk = list(users.filter(id__gt=last_id).only('id', 'username', 'email', 'first_name')[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
+
+
+def claim(user_ids, period, token):
+    """Claim the digests of `user_ids` for `token` and return the ids of the
+    users whose digest is now this run's to send."""
+    now = timezone.now()
+    deliveries = DigestDelivery.objects.filter(period=period, created_by_id__in=user_ids)
+    DigestDelivery.objects.bulk_create(
+        [DigestDelivery(created_by_id=user_id, period=period, claimed_by=token, claimed=now) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    deliveries.filter(sent__isnull=True, claimed__lt=now - CLAIM_TIMEOUT).update(claimed_by=token, claimed=now)
+    return set(deliveries.filter(claimed_by=token, sent__isnull=True).values_list('created_by_id', flat=True))
+
+
+def _shuffled(period):
+    """An expression putting a user's quotes in an order that looks random,
+    is the same for every run of `period` (so that a resumed run picks the
+    same quotes) and differs from week to week and from user to user."""
+    seed = period.toordinal() * HASH_MULTIPLIER % HASH_MODULUS
+    # every term stays below the modulus, so that the sum fits a bigint
+    ids = Mod(F('id') * HASH_MULTIPLIER, HASH_MODULUS)
+    users = Mod(F('created_by_id') * HASH_USER_MULTIPLIER, HASH_MODULUS)
+    return Mod(ids + users + seed, HASH_MODULUS)
+
+
+def _first_per_user(quotes, order_by, count):
+    """The ids of the first `count` of every user's `quotes` in `order_by`,
+    numbered in the database so that only those are sent back."""
+    ranked = quotes.annotate(
+        pick=Window(RowNumber(), partition_by=[F('created_by_id')], order_by=order_by)
+    ).values('id', 'pick')
+    sql, params = ranked.query.sql_with_params()
+    with connections[ranked.db].cursor() as cursor:
+        # window functions can't be filtered on in the ORM
+        cursor.execute(f'SELECT id FROM ({sql}) AS ranked WHERE pick <= %s', (*params, count))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def select_quotes(user_ids, period, random_count=RANDOM_COUNT, recent_count=RECENT_COUNT):
+    """Return {user id: (recent quotes, random older quotes)} for the users
+    that have any quotes. Recent quotes are the ones added in the week
+    before `period`."""
+    if not user_ids:
+        return {}
+    quotes = Quote.objects.filter(created_by_id__in=user_ids)
+    start, end = _start_of(period - datetime.timedelta(days=7)), _start_of(period)
+
+    # the latest `recent_count` quotes of the week and the first `random_count`
+    # older quotes in shuffled order of every user
+    chosen = _first_per_user(
+        quotes.filter(created__gte=start, created__lt=end), [F('created').desc(), F('id').desc()], recent_count
+    ) + _first_per_user(quotes.filter(created__lt=start), [_shuffled(period).asc()], random_count)
+
+    recent, picked = defaultdict(list), defaultdict(list)
+    for quote in quotes.filter(pk__in=chosen).select_related('book__author').defer('search_vector').order_by('-created', '-id'):
+        (recent if quote.created >= start else picked)[quote.created_by_id].append(quote)
+
+    return {user_id: (recent[user_id], picked[user_id]) for user_id in set(recent) | set(picked)}
+
+
+def send_digests(period, chunk_size=CHUNK_SIZE, shard=None, random_count=RANDOM_COUNT, recent_count=RECENT_COUNT, log=lambda message: None):
+    """Send the digests of `period` that no other run has claimed or sent.
+    Returns the number of emails sent."""
+    token = uuid.uuid4().hex
+    # loaded and compiled once for every email of the run
+    text_template = get_template('quotes/digest_email.txt')
+    html_template = get_template('quotes/digest_email.html')
+    site_url = f'https://{Site.objects.get_current().domain}'
+    subject = f"Your quotes for the week of {period:%d %B %Y}"
+
+    sent = 0
+    # one connection to the mail server for the whole run
+    with get_connection() as connection:
+        for users in user_chunks(chunk_size, shard):
+            claimed = claim([user.id for user in users], period, token)
+            selections = select_quotes(claimed, period, random_count, recent_count)
+
+            messages = []
+            for user in users:
+                if user.id not in selections:
+                    continue
+                recent, picked = selections[user.id]
+                context = {'user': user, 'period': period, 'recent': recent, 'picked': picked, 'site_url': site_url}
+                message = EmailMultiAlternatives(subject, text_template.render(context), to=[user.email], connection=connection)
+                message.attach_alternative(html_template.render(context), 'text/html')
+                messages.append(message)
+
+            if messages:
+                connection.send_messages(messages)
+            DigestDelivery.objects.filter(period=period, created_by_id__in=claimed, claimed_by=token).update(sent=timezone.now())
+            sent += len(messages)
+            log(f"Sent {len(messages)} digests to users up to id {users[-1].id}")
+    return sent
@@ -1,5 +1,8 @@
 from django import forms
 
+from .models import Author, Book
+
+
 class QuoteSearchForm(forms.Form):
     search = forms.CharField(
         label="Search",
@@ -7,3 +10,60 @@ class QuoteSearchForm(forms.Form):
         required=False,
         widget=forms.TextInput(attrs={'placeholder': 'Search'})
     )
+
+
+class BookForm(forms.ModelForm):
+    # Authors are typed in as free text and resolved to the user's matching
+    # Author when the book is saved, so spelling variants of the same name
+    # end up together.
+    author = forms.CharField(label="Author", max_length=200)
+
+    class Meta:
+        model = Book
+        fields = ['title']
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        if self.instance.pk:
+            self.initial['author'] = self.instance.author.name
+
+    def save(self, commit=True):
+        previous = self.instance.author_id
+        self.instance.author = Author.objects.resolve(self.cleaned_data['author'], self.user)
+        book = super().save(commit)
+        if commit and previous and previous != book.author_id:
+            Author.objects.filter(pk=previous).unused().delete()
+        return book
+
+
+class QuoteIdsField(forms.Field):
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return [int(pk) for pk in value or []]
+        except (TypeError, ValueError):
+            raise forms.ValidationError("Select quotes to apply the action to.")
+
+
+class BulkQuoteForm(forms.Form):
+    MOVE = 'move'
+    DELETE = 'delete'
+
+    action = forms.ChoiceField(label="Action", choices=[(MOVE, "Move to book"), (DELETE, "Delete")])
+    book = forms.ModelChoiceField(label="Book", queryset=Book.objects.none(), required=False)
+    quotes = QuoteIdsField()
+    next = forms.CharField(required=False, widget=forms.HiddenInput)
+    # set by the confirmation page, deletes are only applied once confirmed
+    confirm = forms.BooleanField(required=False, widget=forms.HiddenInput)
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['book'].queryset = Book.objects.filter(created_by=user).select_related('author').order_by('-modified')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('action') == self.MOVE and not cleaned_data.get('book'):
+            self.add_error('book', "Choose the book to move the quotes to.")
+        return cleaned_data
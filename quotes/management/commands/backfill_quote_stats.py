@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from quotes import stats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user reading statistics from the existing quotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help="Only rebuild statistics for these users.")
+
+    def handle(self, *args, **options):
+        users = None
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+
+        written = stats.backfill(users)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} statistics rows."))
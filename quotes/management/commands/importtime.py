@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a web worker imports before it can answer its first request: the WSGI
+# application and the URLconf, which pulls in every view.
+BOOT_SCRIPT = """
+import {module}
+from django.urls import get_resolver
+get_resolver().url_patterns
+"""
+
+
+def parse_importtime(output):
+    """Parse the stderr of `python -X importtime` into a list of
+    (module, self_us, cumulative_us) tuples."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # the header line
+            continue
+        imports.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return imports
+
+
+STDLIB_GROUP = '(standard library)'
+
+
+def group_of(module, apps):
+    """The installed app a module belongs to, or its top level package."""
+    for app in apps:
+        if module == app or module.startswith(app + '.'):
+            return app
+    package = module.split('.')[0]
+    if package in getattr(sys, 'stdlib_module_names', ()) or package in sys.builtin_module_names:
+        return STDLIB_GROUP
+    return package
+
+
+def group_imports(imports, apps):
+    """Total self time and module count per app, slowest first. Self times
+    don't overlap, so the totals add up to the overall import time."""
+    # longest names first so that django.contrib.admin wins over django
+    apps = sorted(apps, key=len, reverse=True)
+    totals = defaultdict(lambda: [0, 0])
+    for module, self_us, _ in imports:
+        total = totals[group_of(module, apps)]
+        total[0] += self_us
+        total[1] += 1
+    return sorted(((group, us, count) for group, (us, count) in totals.items()), key=lambda row: -row[1])
+
+
+class Command(BaseCommand):
+    help = "Report where a fresh worker spends its time importing, like `python -X importtime` with per-app totals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='quotr.wsgi', help="Module a worker starts from (default: quotr.wsgi).")
+        parser.add_argument('--limit', type=int, default=15, help="Number of apps and of slowest modules to list.")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'quotr.settings'))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT.format(module=options['module'])],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Importing {options['module']} failed:\n{result.stderr[-2000:]}")
+
+        imports = parse_importtime(result.stderr)
+        total = sum(self_us for _, self_us, _ in imports)
+        self.stdout.write(f"{len(imports)} modules imported in {total / 1000:.1f} ms\n")
+
+        self.stdout.write(f"{'app':<40} {'self ms':>9} {'share':>6} {'modules':>8}")
+        for group, self_us, count in group_imports(imports, settings.INSTALLED_APPS)[:options['limit']]:
+            self.stdout.write(f"{group:<40} {self_us / 1000:>9.1f} {self_us / total:>6.1%} {count:>8}")
+
+        self.stdout.write(f"\n{'slowest modules':<60} {'self ms':>9} {'cumul. ms':>10}")
+        for module, self_us, cumulative_us in sorted(imports, key=lambda row: -row[2])[:options['limit']]:
+            self.stdout.write(f"{module:<60} {self_us / 1000:>9.1f} {cumulative_us / 1000:>10.1f}")
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from quotes import partitioning
+
+
+class Command(BaseCommand):
+    help = "Convert the quotes table to hash partitions on the quote owner, or back with --partitions 0. PostgreSQL only."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partitions', type=int, default=settings.QUOTES_QUOTE_PARTITIONS or None,
+                            help="Number of partitions, 0 for a plain table (default: QUOTES_QUOTE_PARTITIONS).")
+        parser.add_argument('--batch-size', type=int, default=10000, help="Quotes copied per transaction.")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--abort', action='store_true',
+                            help="Remove what an interrupted conversion left behind instead.")
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            raise CommandError("Partitioning is only supported on PostgreSQL.")
+        if options['abort']:
+            partitioning.abort(connection)
+            self.stdout.write("Removed what was left of earlier conversions.")
+            return
+
+        partitions = options['partitions']
+        if partitions is None or partitions < 0:
+            raise CommandError("Pass --partitions or set QUOTES_QUOTE_PARTITIONS.")
+
+        current = partitioning.partition_count(connection)
+        if current == partitions:
+            self.stdout.write(f"The quotes table already has {partitions} partitions.")
+            return
+        partitioning.convert(connection, partitions, batch_size=options['batch_size'], log=self.stdout.write)
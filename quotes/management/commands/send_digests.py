@@ -0,0 +1,46 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from quotes import digests
+
+
+def shard(value):
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(value)
+    if not 0 <= index < count:
+        raise ValueError(value)
+    return index, count
+
+
+class Command(BaseCommand):
+    help = (
+        "Email every user their weekly digest of recent and random quotes. Digests that were already sent "
+        "for the week are skipped, so the command can be rerun after an interruption or run in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat, help="Send the digests of the week of this day (default: today).")
+        parser.add_argument('--shard', type=shard, help="Only handle part of the users, e.g. 1/4 for the second of four processes.")
+        parser.add_argument('--chunk-size', type=int, default=digests.CHUNK_SIZE, help="Users handled, and emails sent, at a time.")
+        parser.add_argument('--random', type=int, default=digests.RANDOM_COUNT, help="Random quotes per digest.")
+        parser.add_argument('--recent', type=int, default=digests.RECENT_COUNT, help="Recently added quotes per digest.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        period = digests.period_of(options['date'] or timezone.localdate())
+
+        log = self.stdout.write if options['verbosity'] > 1 else (lambda message: None)
+        sent = digests.send_digests(
+            period,
+            chunk_size=options['chunk_size'],
+            shard=options['shard'],
+            random_count=options['random'],
+            recent_count=options['recent'],
+            log=log,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} digests for the week of {period}."))
@@ -0,0 +1,113 @@
+import cProfile
+import io
+import json
+import marshal
+import pstats
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from .models import RequestProfile
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+DEFAULT_RETENTION = 50
+
+
+class ProfilingMiddleware:
+    """Profile a request to a quotes URL when a staff user asks for it with
+    ?_profile=1 or an X-Profile header. The cProfile stats and every SQL
+    statement with its timing are stored as a RequestProfile, browsable in
+    the admin. Only the latest QUOTES_PROFILE_RETENTION profiles are kept.
+
+    Requests without the flag are passed straight through."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if PROFILE_PARAM not in request.META.get('QUERY_STRING', '') and PROFILE_HEADER not in request.META:
+            return self.get_response(request)
+        if not self.should_profile(request):
+            return self.get_response(request)
+        return self.profile(request)
+
+    def should_profile(self, request):
+        if PROFILE_PARAM not in request.GET and PROFILE_HEADER not in request.META:
+            return False
+        if not request.user.is_staff:
+            return False
+        try:
+            return resolve(request.path_info).namespace == 'quotes'
+        except Resolver404:
+            return False
+
+    def profile(self, request):
+        queries = []
+
+        def record_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append({
+                    'sql': sql,
+                    'params': repr(params),
+                    'duration': (time.perf_counter() - start) * 1000,
+                })
+
+        profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_query))
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            duration = (time.perf_counter() - start) * 1000
+
+        profiler.create_stats()
+        profile = RequestProfile.objects.create(
+            path=request.get_full_path()[:500],
+            method=request.method,
+            status_code=response.status_code,
+            duration=duration,
+            query_count=len(queries),
+            query_duration=sum(query['duration'] for query in queries),
+            queries=json.dumps(queries),
+            stats=marshal.dumps(profiler.stats),
+            created_by=request.user,
+        )
+        prune_profiles()
+
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+
+def prune_profiles():
+    retention = getattr(settings, 'QUOTES_PROFILE_RETENTION', DEFAULT_RETENTION)
+    stale = list(RequestProfile.objects.values_list('pk', flat=True)[retention:])
+    if stale:
+        RequestProfile.objects.filter(pk__in=stale).delete()
+
+
+class _LoadedStats:
+    # pstats.Stats accepts anything with a create_stats() method and a stats
+    # dict, which saves going through a file
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def format_stats(profile, sort='cumulative', limit=40):
+    output = io.StringIO()
+    stats = pstats.Stats(_LoadedStats(marshal.loads(bytes(profile.stats))), stream=output)
+    stats.sort_stats(sort).print_stats(limit)
+    return output.getvalue()
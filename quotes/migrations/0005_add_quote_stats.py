@@ -0,0 +1,29 @@
+# Generated by Django 2.2.8 on 2026-10-19 07:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quotes', '0004_add_created_by_to_models'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuoteStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='quotes.Book')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quote_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('created_by', 'month', 'book')},
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations
+
+# Only SQLite gets the FTS5 index, other databases have their own search
+# backend (see quotes.search).
+FORWARDS = [
+    """CREATE VIRTUAL TABLE quotes_quote_fts USING fts5(text, title, author, tokenize='porter unicode61')""",
+    """CREATE TRIGGER quotes_quote_fts_insert AFTER INSERT ON quotes_quote BEGIN
+        INSERT INTO quotes_quote_fts (rowid, text, title, author)
+        SELECT new.id, new.text, title, author FROM (SELECT NULL) LEFT JOIN quotes_book ON quotes_book.id = new.book_id;
+    END""",
+    """CREATE TRIGGER quotes_quote_fts_update AFTER UPDATE OF text, book_id ON quotes_quote BEGIN
+        DELETE FROM quotes_quote_fts WHERE rowid = old.id;
+        INSERT INTO quotes_quote_fts (rowid, text, title, author)
+        SELECT new.id, new.text, title, author FROM (SELECT NULL) LEFT JOIN quotes_book ON quotes_book.id = new.book_id;
+    END""",
+    """CREATE TRIGGER quotes_quote_fts_delete AFTER DELETE ON quotes_quote BEGIN
+        DELETE FROM quotes_quote_fts WHERE rowid = old.id;
+    END""",
+    # books may be inserted after their quotes when loading fixtures
+    """CREATE TRIGGER quotes_book_fts_insert AFTER INSERT ON quotes_book BEGIN
+        UPDATE quotes_quote_fts SET title = new.title, author = new.author
+        WHERE rowid IN (SELECT id FROM quotes_quote WHERE book_id = new.id);
+    END""",
+    """CREATE TRIGGER quotes_book_fts_update AFTER UPDATE OF title, author ON quotes_book BEGIN
+        UPDATE quotes_quote_fts SET title = new.title, author = new.author
+        WHERE rowid IN (SELECT id FROM quotes_quote WHERE book_id = new.id);
+    END""",
+    """INSERT INTO quotes_quote_fts (rowid, text, title, author)
+        SELECT quotes_quote.id, quotes_quote.text, quotes_book.title, quotes_book.author
+        FROM quotes_quote JOIN quotes_book ON quotes_book.id = quotes_quote.book_id""",
+]
+
+BACKWARDS = [
+    'DROP TRIGGER IF EXISTS quotes_book_fts_update',
+    'DROP TRIGGER IF EXISTS quotes_book_fts_insert',
+    'DROP TRIGGER IF EXISTS quotes_quote_fts_delete',
+    'DROP TRIGGER IF EXISTS quotes_quote_fts_update',
+    'DROP TRIGGER IF EXISTS quotes_quote_fts_insert',
+    'DROP TABLE IF EXISTS quotes_quote_fts',
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0005_add_quote_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(FORWARDS), run_on_sqlite(BACKWARDS)),
+    ]
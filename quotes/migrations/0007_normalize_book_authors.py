@@ -0,0 +1,157 @@
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# a copy of quotes.models.normalize_author_name as it was when this migration
+# was written, so that later changes to it don't change what this one does
+def normalize_author_name(name):
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c)).casefold()
+    return ' '.join(re.sub(r'[^\w\s]', ' ', name).split())
+
+# The SQLite search index triggers from 0006 read quotes_book.author, which
+# becomes a foreign key here. They are dropped while the column changes and
+# recreated to read the name from quotes_author.
+SQLITE_DROP_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS quotes_book_fts_update',
+    'DROP TRIGGER IF EXISTS quotes_book_fts_insert',
+    'DROP TRIGGER IF EXISTS quotes_quote_fts_update',
+    'DROP TRIGGER IF EXISTS quotes_quote_fts_insert',
+]
+
+SQLITE_CREATE_TRIGGERS = [
+    """CREATE TRIGGER quotes_quote_fts_insert AFTER INSERT ON quotes_quote BEGIN
+        INSERT INTO quotes_quote_fts (rowid, text, title, author)
+        SELECT new.id, new.text, quotes_book.title, quotes_author.name FROM (SELECT NULL)
+        LEFT JOIN quotes_book ON quotes_book.id = new.book_id
+        LEFT JOIN quotes_author ON quotes_author.id = quotes_book.author_id;
+    END""",
+    """CREATE TRIGGER quotes_quote_fts_update AFTER UPDATE OF text, book_id ON quotes_quote BEGIN
+        DELETE FROM quotes_quote_fts WHERE rowid = old.id;
+        INSERT INTO quotes_quote_fts (rowid, text, title, author)
+        SELECT new.id, new.text, quotes_book.title, quotes_author.name FROM (SELECT NULL)
+        LEFT JOIN quotes_book ON quotes_book.id = new.book_id
+        LEFT JOIN quotes_author ON quotes_author.id = quotes_book.author_id;
+    END""",
+    """CREATE TRIGGER quotes_book_fts_insert AFTER INSERT ON quotes_book BEGIN
+        UPDATE quotes_quote_fts SET title = new.title, author = (SELECT name FROM quotes_author WHERE id = new.author_id)
+        WHERE rowid IN (SELECT id FROM quotes_quote WHERE book_id = new.id);
+    END""",
+    """CREATE TRIGGER quotes_book_fts_update AFTER UPDATE OF title, author_id ON quotes_book BEGIN
+        UPDATE quotes_quote_fts SET title = new.title, author = (SELECT name FROM quotes_author WHERE id = new.author_id)
+        WHERE rowid IN (SELECT id FROM quotes_quote WHERE book_id = new.id);
+    END""",
+    """CREATE TRIGGER quotes_author_fts_update AFTER UPDATE OF name ON quotes_author BEGIN
+        UPDATE quotes_quote_fts SET author = new.name
+        WHERE rowid IN (SELECT quotes_quote.id FROM quotes_quote JOIN quotes_book ON quotes_book.id = quotes_quote.book_id WHERE quotes_book.author_id = new.id);
+    END""",
+]
+
+SQLITE_RESTORE_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS quotes_author_fts_update',
+    """CREATE TRIGGER quotes_quote_fts_insert AFTER INSERT ON quotes_quote BEGIN
+        INSERT INTO quotes_quote_fts (rowid, text, title, author)
+        SELECT new.id, new.text, title, author FROM (SELECT NULL) LEFT JOIN quotes_book ON quotes_book.id = new.book_id;
+    END""",
+    """CREATE TRIGGER quotes_quote_fts_update AFTER UPDATE OF text, book_id ON quotes_quote BEGIN
+        DELETE FROM quotes_quote_fts WHERE rowid = old.id;
+        INSERT INTO quotes_quote_fts (rowid, text, title, author)
+        SELECT new.id, new.text, title, author FROM (SELECT NULL) LEFT JOIN quotes_book ON quotes_book.id = new.book_id;
+    END""",
+    """CREATE TRIGGER quotes_book_fts_insert AFTER INSERT ON quotes_book BEGIN
+        UPDATE quotes_quote_fts SET title = new.title, author = new.author
+        WHERE rowid IN (SELECT id FROM quotes_quote WHERE book_id = new.id);
+    END""",
+    """CREATE TRIGGER quotes_book_fts_update AFTER UPDATE OF title, author ON quotes_book BEGIN
+        UPDATE quotes_quote_fts SET title = new.title, author = new.author
+        WHERE rowid IN (SELECT id FROM quotes_quote WHERE book_id = new.id);
+    END""",
+]
+
+
+def run_on_sqlite(*statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def link_authors(apps, schema_editor):
+    Author = apps.get_model('quotes', 'Author')
+    Book = apps.get_model('quotes', 'Book')
+
+    pairs = Book.objects.values_list('created_by', 'author').distinct().order_by()
+    for user_id, name in pairs.iterator():
+        author, _ = Author.objects.get_or_create(
+            created_by_id=user_id,
+            normalized_name=normalize_author_name(name),
+            defaults={'name': ' '.join(name.split())},
+        )
+        Book.objects.filter(created_by_id=user_id, author=name).update(author_ref=author)
+
+
+def unlink_authors(apps, schema_editor):
+    Author = apps.get_model('quotes', 'Author')
+    Book = apps.get_model('quotes', 'Book')
+
+    for author in Author.objects.iterator():
+        Book.objects.filter(author_ref=author).update(author=author.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quotes', '0006_add_sqlite_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(*SQLITE_DROP_TRIGGERS), run_on_sqlite(*SQLITE_DROP_TRIGGERS, *SQLITE_RESTORE_TRIGGERS)),
+        migrations.CreateModel(
+            name='Author',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('normalized_name', models.CharField(editable=False, max_length=200)),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', models.DateTimeField(auto_now=True, verbose_name='modified')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='authors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('created_by', 'normalized_name')},
+            },
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='author_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='quotes.Author'),
+        ),
+        migrations.RunPython(link_authors, unlink_authors),
+        # gives the column a default so that it can be added back when unapplying
+        migrations.AlterField(
+            model_name='book',
+            name='author',
+            field=models.CharField(default='', max_length=200),
+        ),
+        migrations.RemoveField(
+            model_name='book',
+            name='author',
+        ),
+        migrations.RenameField(
+            model_name='book',
+            old_name='author_ref',
+            new_name='author',
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='books', to='quotes.Author'),
+        ),
+        migrations.RunPython(run_on_sqlite(*SQLITE_CREATE_TRIGGERS), run_on_sqlite(*SQLITE_DROP_TRIGGERS, 'DROP TRIGGER IF EXISTS quotes_author_fts_update')),
+    ]
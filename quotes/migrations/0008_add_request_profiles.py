@@ -0,0 +1,35 @@
+# Generated by Django 2.2.8 on 2026-10-19 07:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quotes', '0007_normalize_book_authors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500)),
+                ('method', models.CharField(max_length=10)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('duration', models.FloatField(verbose_name='duration (ms)')),
+                ('query_count', models.PositiveIntegerField()),
+                ('query_duration', models.FloatField(verbose_name='query duration (ms)')),
+                ('queries', models.TextField()),
+                ('stats', models.BinaryField()),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='request_profiles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created', '-id'],
+            },
+        ),
+    ]
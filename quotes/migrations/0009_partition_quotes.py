@@ -0,0 +1,240 @@
+from django.conf import settings
+from django.db import OperationalError, migrations, models, transaction
+
+LISTING_INDEX = models.Index(fields=['created_by', '-modified', '-id'], name='quotes_quote_user_listing')
+
+
+def add_listing_index(apps, schema_editor):
+    sql = str(LISTING_INDEX.create_sql(apps.get_model('quotes', 'Quote'), schema_editor))
+    if schema_editor.connection.vendor == 'postgresql':
+        # builds the index without blocking writes to a large table
+        sql = sql.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+    schema_editor.execute(sql)
+
+
+def remove_listing_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {LISTING_INDEX.name}')
+    else:
+        schema_editor.execute(str(LISTING_INDEX.remove_sql(apps.get_model('quotes', 'Quote'), schema_editor)))
+
+
+# A copy of quotes.partitioning as it was when this migration was written, so
+# that later changes to it don't change what this one does.
+TABLE = 'quotes_quote'
+NEW_TABLE = 'quotes_quote_converted'
+OLD_TABLE = 'quotes_quote_previous'
+MIRROR = 'quotes_quote_conversion_mirror'
+# how long and how often the swap waits for its lock on the quotes table
+LOCK_TIMEOUT = '5s'
+SWAP_ATTEMPTS = 5
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+def partition_count(connection):
+    """The number of hash partitions of the quotes table, 0 if it is not
+    partitioned."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM pg_inherits JOIN pg_partitioned_table ON partrelid = inhparent "
+            "WHERE inhparent = %s::regclass",
+            [TABLE],
+        )
+        return cursor.fetchone()[0]
+
+
+def _fetch(cursor, sql, params=()):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def _exists(cursor, name):
+    return _fetch(cursor, "SELECT to_regclass(%s) IS NOT NULL", [name])[0][0]
+
+
+def abort(connection):
+    """Remove the new table, its partitions and the mirror trigger left behind
+    by a conversion that failed or was interrupted."""
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {MIRROR} ON {TABLE}")
+        cursor.execute(f"DROP FUNCTION IF EXISTS {MIRROR}()")
+        cursor.execute(f"DROP TABLE IF EXISTS {NEW_TABLE}")
+
+
+def convert(connection, partitions, batch_size=10000):
+    """Rebuild the quotes table with `partitions` hash partitions on
+    created_by_id, or as a plain table when `partitions` is 0."""
+    with connection.cursor() as cursor:
+        if _exists(cursor, NEW_TABLE):
+            raise RuntimeError(f"{NEW_TABLE} is left over from an earlier conversion, remove it with partition_quotes --abort.")
+        columns = [row[0] for row in _fetch(
+            cursor,
+            "SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped ORDER BY attnum",
+            [TABLE],
+        )]
+        indexes = _fetch(
+            cursor,
+            "SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid) FROM pg_index "
+            "WHERE indrelid = %s::regclass AND NOT indisprimary",
+            [TABLE],
+        )
+        foreign_keys = _fetch(
+            cursor,
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        triggers = _fetch(
+            cursor,
+            "SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = %s::regclass AND NOT tgisinternal",
+            [TABLE],
+        )
+        primary_key = _fetch(
+            cursor,
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+            [TABLE],
+        )[0][0]
+    quote_name = connection.ops.quote_name
+    key_columns = ['id', 'created_by_id'] if partitions else ['id']
+    key = f"({', '.join(key_columns)})"
+    column_list = ', '.join(quote_name(column) for column in columns)
+    update_list = ', '.join(f"{quote_name(column)} = EXCLUDED.{quote_name(column)}" for column in columns if column not in key_columns)
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        partition_by = ' PARTITION BY HASH (created_by_id)' if partitions else ''
+        cursor.execute(f"CREATE TABLE {NEW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS){partition_by}")
+        cursor.execute(f"ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {NEW_TABLE}_pkey PRIMARY KEY {key}")
+        for remainder in range(partitions):
+            cursor.execute(
+                f"CREATE TABLE {NEW_TABLE}_p{remainder} PARTITION OF {NEW_TABLE} "
+                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            )
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {name}_converted {definition}")
+        for name, definition in indexes:
+            # CREATE INDEX name ON public.quotes_quote USING ... -> the new table
+            on_table = definition.index(' ON ')
+            using = definition.index(' USING ')
+            cursor.execute(f"{definition[:on_table].replace(name, name + '_converted', 1)} ON {NEW_TABLE}{definition[using:]}")
+        for name, definition in triggers:
+            on_table = definition.index(' ON ')
+            rest = definition.index(' FOR EACH ')
+            cursor.execute(f"{definition[:on_table]} ON {NEW_TABLE}{definition[rest:]}")
+
+        # Keep the new table up to date with writes made while copying. The
+        # upsert takes over a row that a copy batch inserted in the meantime.
+        cursor.execute(f"""
+            CREATE FUNCTION {MIRROR}() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {NEW_TABLE} WHERE id = OLD.id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {NEW_TABLE} ({column_list}) SELECT {column_list} FROM (SELECT NEW.*) AS new_row
+                    ON CONFLICT {key} DO UPDATE SET {update_list};
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        cursor.execute(f"CREATE TRIGGER {MIRROR} AFTER INSERT OR UPDATE OR DELETE ON {TABLE} FOR EACH ROW EXECUTE PROCEDURE {MIRROR}()")
+
+    try:
+        _copy(connection, column_list, batch_size)
+        for attempt in range(1, SWAP_ATTEMPTS + 1):
+            try:
+                _swap(connection, partitions, primary_key, foreign_keys, indexes)
+                break
+            except OperationalError as e:
+                if getattr(e.__cause__, 'pgcode', None) != LOCK_NOT_AVAILABLE or attempt == SWAP_ATTEMPTS:
+                    raise
+    except BaseException:
+        abort(connection)
+        raise
+
+
+def _copy(connection, column_list, batch_size):
+    with connection.cursor() as cursor:
+        last_id = _fetch(cursor, f"SELECT coalesce(max(id), 0) FROM {TABLE}")[0][0]
+    for start in range(0, last_id, batch_size):
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            # FOR SHARE makes writes to these rows wait until the batch is
+            # committed, so that the mirror trigger sees and replaces them.
+            # Rows already mirrored by the trigger are newer, keep those.
+            cursor.execute(
+                f"INSERT INTO {NEW_TABLE} ({column_list}) SELECT {column_list} FROM {TABLE} "
+                f"WHERE id > %s AND id <= %s FOR SHARE ON CONFLICT DO NOTHING",
+                [start, start + batch_size],
+            )
+            missing = _fetch(
+                cursor,
+                f"SELECT count(*) FROM ((SELECT id FROM {TABLE} WHERE id > %s AND id <= %s "
+                f"EXCEPT SELECT id FROM {NEW_TABLE} WHERE id > %s AND id <= %s) UNION ALL "
+                f"(SELECT id FROM {NEW_TABLE} WHERE id > %s AND id <= %s "
+                f"EXCEPT SELECT id FROM {TABLE} WHERE id > %s AND id <= %s)) AS differences",
+                [start, start + batch_size] * 4,
+            )[0][0]
+            if missing:
+                raise RuntimeError(f"{NEW_TABLE} and {TABLE} differ in {missing} quotes with ids from {start + 1} to {start + batch_size}.")
+
+
+def _swap(connection, partitions, primary_key, foreign_keys, indexes):
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        # rather fail than queue every other query behind a lock that waits
+        # for a long running one
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        # every batch was compared when it was copied and the trigger has
+        # mirrored every write since, so this only has to look at the end
+        # of the primary key indexes
+        old_max = _fetch(cursor, f"SELECT max(id) FROM {TABLE}")[0][0]
+        new_max = _fetch(cursor, f"SELECT max(id) FROM {NEW_TABLE}")[0][0]
+        if old_max != new_max:
+            raise RuntimeError(f"{NEW_TABLE} ends at id {new_max} but {TABLE} at {old_max}, not swapping.")
+
+        cursor.execute(f"DROP TRIGGER {MIRROR} ON {TABLE}")
+        cursor.execute(f"DROP FUNCTION {MIRROR}()")
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+        cursor.execute(f"ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}")
+        # the id sequence would otherwise be dropped along with the old table
+        cursor.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+        # takes the partitions of a previously partitioned table with it
+        cursor.execute(f"DROP TABLE {OLD_TABLE}")
+
+        # give everything its old name back, so later migrations find it
+        for remainder in range(partitions):
+            cursor.execute(f"ALTER TABLE {NEW_TABLE}_p{remainder} RENAME TO {TABLE}_p{remainder}")
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {NEW_TABLE}_pkey TO {primary_key}")
+        for name, _ in foreign_keys:
+            cursor.execute(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {name}_converted TO {name}")
+        for name, _ in indexes:
+            cursor.execute(f"ALTER INDEX {name}_converted RENAME TO {name}")
+
+
+def partition(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql' and settings.QUOTES_QUOTE_PARTITIONS:
+        convert(connection, settings.QUOTES_QUOTE_PARTITIONS)
+
+
+def unpartition(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql' and partition_count(connection):
+        convert(connection, 0)
+
+
+class Migration(migrations.Migration):
+    # creates its index concurrently and the conversion commits its batches
+    # as it goes
+    atomic = False
+
+    dependencies = [
+        ('quotes', '0008_add_request_profiles'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(add_listing_index, remove_listing_index)],
+            state_operations=[migrations.AddIndex(model_name='quote', index=LISTING_INDEX)],
+        ),
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,173 @@
+import django.contrib.postgres.search
+from django.db import migrations, transaction
+
+# On PostgreSQL quotes get a stored search vector with a GIN index, kept up to
+# date by triggers on quotes, books and authors. Other databases have their
+# own search backend (see quotes.search) and leave the column empty. The
+# existing quotes are filled in and indexed afterwards, without holding on to
+# locks on the whole table.
+POSTGRES_FORWARDS = [
+    """CREATE FUNCTION quotes_quote_search_vector(quote_text text, quote_book_id integer) RETURNS tsvector AS $$
+        SELECT to_tsvector(concat_ws(' ', quote_text, quotes_book.title, quotes_author.name))
+        FROM (SELECT 1) AS one
+        LEFT JOIN quotes_book ON quotes_book.id = quote_book_id
+        LEFT JOIN quotes_author ON quotes_author.id = quotes_book.author_id
+    $$ LANGUAGE sql STABLE""",
+    """CREATE FUNCTION quotes_quote_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := quotes_quote_search_vector(NEW.text, NEW.book_id);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER quotes_quote_search_vector BEFORE INSERT OR UPDATE OF text, book_id, search_vector ON quotes_quote
+        FOR EACH ROW EXECUTE PROCEDURE quotes_quote_search_vector_update()""",
+    # books may be inserted after their quotes when loading fixtures
+    """CREATE FUNCTION quotes_book_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE quotes_quote SET search_vector = NULL WHERE book_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER quotes_book_search_vector AFTER INSERT OR UPDATE OF title, author_id ON quotes_book
+        FOR EACH ROW EXECUTE PROCEDURE quotes_book_search_vector_update()""",
+    """CREATE FUNCTION quotes_author_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE quotes_quote SET search_vector = NULL
+        WHERE book_id IN (SELECT id FROM quotes_book WHERE author_id = NEW.id);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER quotes_author_search_vector AFTER UPDATE OF name ON quotes_author
+        FOR EACH ROW EXECUTE PROCEDURE quotes_author_search_vector_update()""",
+]
+
+POSTGRES_BACKWARDS = [
+    'DROP TRIGGER IF EXISTS quotes_author_search_vector ON quotes_author',
+    'DROP FUNCTION IF EXISTS quotes_author_search_vector_update()',
+    'DROP TRIGGER IF EXISTS quotes_book_search_vector ON quotes_book',
+    'DROP FUNCTION IF EXISTS quotes_book_search_vector_update()',
+    'DROP TRIGGER IF EXISTS quotes_quote_search_vector ON quotes_quote',
+    'DROP FUNCTION IF EXISTS quotes_quote_search_vector_update()',
+    'DROP FUNCTION IF EXISTS quotes_quote_search_vector(text, integer)',
+]
+
+
+# SQLite rebuilds quotes_quote to add the column, which drops the triggers of
+# its search index and breaks the ones on other tables reading from it, so
+# they are dropped beforehand and recreated afterwards.
+SQLITE_DROP_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS quotes_author_fts_update',
+    'DROP TRIGGER IF EXISTS quotes_book_fts_update',
+    'DROP TRIGGER IF EXISTS quotes_book_fts_insert',
+    'DROP TRIGGER IF EXISTS quotes_quote_fts_delete',
+    'DROP TRIGGER IF EXISTS quotes_quote_fts_update',
+    'DROP TRIGGER IF EXISTS quotes_quote_fts_insert',
+]
+
+SQLITE_CREATE_TRIGGERS = [
+    """CREATE TRIGGER quotes_quote_fts_insert AFTER INSERT ON quotes_quote BEGIN
+        INSERT INTO quotes_quote_fts (rowid, text, title, author)
+        SELECT new.id, new.text, quotes_book.title, quotes_author.name FROM (SELECT NULL)
+        LEFT JOIN quotes_book ON quotes_book.id = new.book_id
+        LEFT JOIN quotes_author ON quotes_author.id = quotes_book.author_id;
+    END""",
+    """CREATE TRIGGER quotes_quote_fts_update AFTER UPDATE OF text, book_id ON quotes_quote BEGIN
+        DELETE FROM quotes_quote_fts WHERE rowid = old.id;
+        INSERT INTO quotes_quote_fts (rowid, text, title, author)
+        SELECT new.id, new.text, quotes_book.title, quotes_author.name FROM (SELECT NULL)
+        LEFT JOIN quotes_book ON quotes_book.id = new.book_id
+        LEFT JOIN quotes_author ON quotes_author.id = quotes_book.author_id;
+    END""",
+    """CREATE TRIGGER quotes_quote_fts_delete AFTER DELETE ON quotes_quote BEGIN
+        DELETE FROM quotes_quote_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER quotes_book_fts_insert AFTER INSERT ON quotes_book BEGIN
+        UPDATE quotes_quote_fts SET title = new.title, author = (SELECT name FROM quotes_author WHERE id = new.author_id)
+        WHERE rowid IN (SELECT id FROM quotes_quote WHERE book_id = new.id);
+    END""",
+    """CREATE TRIGGER quotes_book_fts_update AFTER UPDATE OF title, author_id ON quotes_book BEGIN
+        UPDATE quotes_quote_fts SET title = new.title, author = (SELECT name FROM quotes_author WHERE id = new.author_id)
+        WHERE rowid IN (SELECT id FROM quotes_quote WHERE book_id = new.id);
+    END""",
+    """CREATE TRIGGER quotes_author_fts_update AFTER UPDATE OF name ON quotes_author BEGIN
+        UPDATE quotes_quote_fts SET author = new.name
+        WHERE rowid IN (SELECT quotes_quote.id FROM quotes_quote JOIN quotes_book ON quotes_book.id = quotes_quote.book_id WHERE quotes_book.author_id = new.id);
+    END""",
+]
+
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def run_on(vendor, statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != vendor:
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def backfill_search_vectors(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT coalesce(max(id), 0) FROM quotes_quote')
+        last_id = cursor.fetchone()[0]
+    # the quote trigger fills in the vector, one short transaction per batch
+    for start in range(0, last_id, BACKFILL_BATCH_SIZE):
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE quotes_quote SET search_vector = NULL WHERE id > %s AND id <= %s',
+                [start, start + BACKFILL_BATCH_SIZE],
+            )
+
+
+def add_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'quotes_quote'::regclass")
+        partitions = [row[0] for row in cursor.fetchall()]
+    if not partitions:
+        schema_editor.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS quotes_quote_search_vector_gin ON quotes_quote USING gin (search_vector)'
+        )
+        return
+    # an index on a partitioned table can't be built concurrently, so it is
+    # built that way on every partition and attached to an empty one on the table
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS quotes_quote_search_vector_gin ON ONLY quotes_quote USING gin (search_vector)')
+    for partition in partitions:
+        schema_editor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_search_vector_gin ON {partition} USING gin (search_vector)')
+        schema_editor.execute(f'ALTER INDEX quotes_quote_search_vector_gin ATTACH PARTITION {partition}_search_vector_gin')
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # not concurrently, which indexes of partitioned tables don't support
+        schema_editor.execute('DROP INDEX IF EXISTS quotes_quote_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+    # the backfill commits its batches as it goes and the index is built
+    # concurrently, the triggers are changed in a transaction each
+    atomic = False
+
+    dependencies = [
+        ('quotes', '0009_partition_quotes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on('sqlite', SQLITE_DROP_TRIGGERS), run_on('sqlite', SQLITE_CREATE_TRIGGERS), atomic=True),
+        migrations.AddField(
+            model_name='quote',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_on('sqlite', SQLITE_CREATE_TRIGGERS), run_on('sqlite', SQLITE_DROP_TRIGGERS), atomic=True),
+        migrations.RunPython(run_on('postgresql', POSTGRES_FORWARDS), run_on('postgresql', POSTGRES_BACKWARDS), atomic=True),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
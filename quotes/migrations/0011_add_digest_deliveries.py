@@ -0,0 +1,30 @@
+# Generated by Django 2.2.8 on 2026-10-19 07:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quotes', '0010_add_quote_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestDelivery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('claimed_by', models.CharField(max_length=32)),
+                ('claimed', models.DateTimeField()),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='digest_deliveries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('created_by', 'period')},
+            },
+        ),
+    ]
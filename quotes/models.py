@@ -1,15 +1,64 @@
+import re
+import unicodedata
+
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.contrib import admin
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
 from django.urls import reverse
 
+from .signals import ROW_FIELDS, quotes_deleted
+
 User = get_user_model()
 
 
+def normalize_author_name(name):
+    # "Gabriel García Márquez", "gabriel garcia marquez" and
+    # "Gabriel  Garcia-Marquez" all end up as the same author
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c)).casefold()
+    return ' '.join(re.sub(r'[^\w\s]', ' ', name).split())
+
+class AuthorQuerySet(models.QuerySet):
+    def resolve(self, name, user):
+        """Find the user's author matching `name`, creating it if needed."""
+        author, _ = self.get_or_create(
+            created_by=user,
+            normalized_name=normalize_author_name(name),
+            defaults={'name': ' '.join(name.split())},
+        )
+        return author
+
+    def unused(self):
+        """Authors without any books left."""
+        return self.filter(books__isnull=True)
+
+class Author(models.Model):
+    name = models.CharField(max_length=200)
+    normalized_name = models.CharField(max_length=200, editable=False)
+    created = models.DateTimeField('created', auto_now_add=True)
+    created_by = models.ForeignKey(User, related_name='authors', null=False, blank=False, on_delete=models.CASCADE)
+    modified = models.DateTimeField('modified', auto_now=True)
+
+    objects = AuthorQuerySet.as_manager()
+
+    class Meta:
+        unique_together = [['created_by', 'normalized_name']]
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_author_name(self.name)
+        super().save(*args, **kwargs)
+
+    def get_absolute_url(self):
+        return reverse('quotes:detail-author', args=(self.pk,))
+
+    def __str__(self):
+        return self.name
+
 class Book(models.Model):
     title = models.CharField(max_length=200)
-    author = models.CharField(max_length=200)
+    author = models.ForeignKey(Author, related_name='books', on_delete=models.CASCADE)
     created = models.DateTimeField('created', auto_now_add=True)
     created_by = models.ForeignKey(User, related_name='books', null=False, blank=False, on_delete=models.CASCADE)
     modified = models.DateTimeField('modified', auto_now=True)
@@ -20,6 +69,22 @@ class Book(models.Model):
     def __str__(self):
         return f"{self.title} by {self.author}"
 
+class QuoteQuerySet(models.QuerySet):
+    def delete(self):
+        """Delete the quotes with a single DELETE and send quotes_deleted for
+        them, which keeps the statistics and search index up to date."""
+        with transaction.atomic(using=self.db):
+            rows = list(self.select_for_update().values(*ROW_FIELDS))
+            if not rows:
+                return 0, {}
+            # the base manager's plain QuerySet, without post_delete receivers
+            # for quotes nothing has to be collected and this is one statement
+            result = self.model._base_manager.using(self.db).filter(pk__in=[row['id'] for row in rows]).delete()
+            quotes_deleted.send(sender=self.model, rows=rows)
+        return result
+    delete.alters_data = True
+    delete.queryset_only = True
+
 class Quote(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     text = models.TextField()
@@ -27,6 +92,30 @@ class Quote(models.Model):
     created = models.DateTimeField('created', auto_now_add=True)
     created_by = models.ForeignKey(User, related_name='quotes', null=False, blank=False, on_delete=models.CASCADE)
     modified = models.DateTimeField('modified', auto_now=True)
+    # Quote text, book title and author, maintained by database triggers on
+    # PostgreSQL for quotes.search.postgres. Unused elsewhere.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = QuoteQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # a user's quotes in the order they are listed
+            models.Index(fields=['created_by', '-modified', '-id'], name='quotes_quote_user_listing'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # keep the loaded values around so that saves can tell what changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def delete(self, *args, **kwargs):
+        row = {field: getattr(self, field) for field in ROW_FIELDS}
+        result = super().delete(*args, **kwargs)
+        quotes_deleted.send(sender=Quote, rows=[row])
+        return result
 
     def get_absolute_url(self):
         return reverse('quotes:detail-quote', args=(self.pk,))
@@ -40,5 +129,60 @@ class Quote(models.Model):
         truncated_text = self.text[:20]+'...' if len(self.text) > 20 else self.text
         return f"{truncated_text} by {self.book.author}"
 
+class QuoteStat(models.Model):
+    # Rollup of how many quotes a user saved from a book in a given month.
+    # Kept up to date by quotes.stats so that statistics never have to scan
+    # a user's whole history.
+    created_by = models.ForeignKey(User, related_name='quote_stats', on_delete=models.CASCADE)
+    book = models.ForeignKey(Book, related_name='stats', on_delete=models.CASCADE)
+    month = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['created_by', 'month', 'book']]
+
+    def __str__(self):
+        return f"{self.count} from {self.book.title} in {self.month:%B %Y}"
+
+class RequestProfile(models.Model):
+    # A profile of a single request, captured on demand for staff users by
+    # quotes.middleware.ProfilingMiddleware.
+    path = models.CharField(max_length=500)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField()
+    duration = models.FloatField('duration (ms)')
+    query_count = models.PositiveIntegerField()
+    query_duration = models.FloatField('query duration (ms)')
+    # JSON list of {"sql", "params", "duration"}, in execution order
+    queries = models.TextField()
+    # marshalled cProfile stats, the same format as pstats.Stats.dump_stats()
+    stats = models.BinaryField()
+    created = models.DateTimeField('created', auto_now_add=True)
+    created_by = models.ForeignKey(User, related_name='request_profiles', null=False, blank=False, on_delete=models.CASCADE)
+
+    class Meta:
+        ordering = ['-created', '-id']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration:.0f} ms)"
+
+class DigestDelivery(models.Model):
+    # The weekly digest of a user, claimed by one run of `manage.py
+    # send_digests` so that parallel runs don't send it twice and a run that
+    # was interrupted can be resumed. `sent` is also set when the user had
+    # nothing to send.
+    created_by = models.ForeignKey(User, related_name='digest_deliveries', on_delete=models.CASCADE)
+    period = models.DateField()
+    claimed_by = models.CharField(max_length=32)
+    claimed = models.DateTimeField()
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = [['created_by', 'period']]
+
+    def __str__(self):
+        return f"Digest of {self.created_by} for the week of {self.period}"
+
+admin.site.register(Author)
 admin.site.register(Book)
 admin.site.register(Quote)
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .base import SearchBackend, tokenize
+
+# used when QUOTES_SEARCH_BACKEND is not set, based on the database in use
+DEFAULT_BACKENDS = {
+    'postgresql': 'quotes.search.postgres.PostgresSearchBackend',
+    'sqlite': 'quotes.search.sqlite.SQLiteSearchBackend',
+}
+FALLBACK_BACKEND = 'quotes.search.memory.InMemorySearchBackend'
+
+_backends = {}
+
+
+def get_backend():
+    path = getattr(settings, 'QUOTES_SEARCH_BACKEND', None) or DEFAULT_BACKENDS.get(connection.vendor, FALLBACK_BACKEND)
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
@@ -0,0 +1,17 @@
+import re
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+class SearchBackend:
+    """Full text search over quotes, including the title and author of the
+    book they come from."""
+
+    def search(self, quotes, query):
+        """Narrow the `quotes` queryset down to the ones matching `query`,
+        annotated with a `rank` and ordered from best to worst match."""
+        raise NotImplementedError('subclasses of SearchBackend must provide a search() method')
@@ -0,0 +1,248 @@
+import math
+import threading
+from collections import Counter, defaultdict
+from itertools import chain
+
+from django.db.models import Case, FloatField, Value, When
+from django.db.models.signals import post_delete, post_save
+
+from ..models import Author, Book, Quote
+from ..signals import quotes_deleted, quotes_moved
+from .base import SearchBackend, tokenize
+from .query import parse, positive
+
+
+class InMemorySearchBackend(SearchBackend):
+    """An inverted index held in process memory, ranked with BM25.
+
+    The index is built from the database on the first search and kept up to
+    date by model signals afterwards. Every process has its own copy, so this
+    is meant for tests and small single-process deployments."""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+        uid = f'{__name__}.{id(self)}'
+        post_save.connect(self._quote_saved, sender=Quote, weak=False, dispatch_uid=f'{uid}.quote_saved')
+        post_save.connect(self._book_saved, sender=Book, weak=False, dispatch_uid=f'{uid}.book_saved')
+        post_delete.connect(self._book_deleted, sender=Book, weak=False, dispatch_uid=f'{uid}.book_deleted')
+        post_save.connect(self._author_saved, sender=Author, weak=False, dispatch_uid=f'{uid}.author_saved')
+        quotes_moved.connect(self._quotes_moved, weak=False, dispatch_uid=f'{uid}.quotes_moved')
+        quotes_deleted.connect(self._quotes_deleted, weak=False, dispatch_uid=f'{uid}.quotes_deleted')
+
+    def reset(self):
+        """Drop the index so that it is rebuilt from the database on the next
+        search."""
+        with self._lock:
+            self._built = False
+            # quote id -> (book id, words of the quote text)
+            self._docs = {}
+            # book id -> (words of its title, words of its author)
+            self._books = {}
+            self._book_docs = defaultdict(set)
+            # term -> {quote id: term frequency}
+            self._postings = defaultdict(dict)
+            self._lengths = {}
+
+    def _fields(self, quote_id):
+        book_id, text_words = self._docs[quote_id]
+        return (text_words, *self._books.get(book_id, ()))
+
+    def _terms(self, quote_id):
+        return Counter(chain.from_iterable(self._fields(quote_id)))
+
+    def _add(self, quote_id):
+        terms = self._terms(quote_id)
+        for term, frequency in terms.items():
+            self._postings[term][quote_id] = frequency
+        self._lengths[quote_id] = sum(terms.values())
+
+    def _remove(self, quote_id):
+        if quote_id not in self._lengths:
+            return
+        for term in self._terms(quote_id):
+            postings = self._postings[term]
+            postings.pop(quote_id, None)
+            if not postings:
+                del self._postings[term]
+        del self._lengths[quote_id]
+
+    def _set_book(self, book_id, title, author):
+        self._books[book_id] = (tuple(tokenize(title)), tuple(tokenize(author)))
+
+    def _set_quote(self, quote_id, book_id, text):
+        self._remove(quote_id)
+        if quote_id in self._docs:
+            self._book_docs[self._docs[quote_id][0]].discard(quote_id)
+        self._docs[quote_id] = (book_id, tuple(tokenize(text)))
+        self._book_docs[book_id].add(quote_id)
+        self._add(quote_id)
+
+    def _build(self):
+        for book_id, title, author in Book.objects.values_list('id', 'title', 'author__name').iterator():
+            self._set_book(book_id, title, author)
+        for quote_id, book_id, text in Quote.objects.values_list('id', 'book_id', 'text').iterator():
+            self._set_quote(quote_id, book_id, text)
+        self._built = True
+
+    def _quote_saved(self, sender, instance, **kwargs):
+        with self._lock:
+            if not self._built:
+                return
+            if instance.book_id not in self._books:
+                # when loading fixtures the book may only be saved later on
+                book = Book.objects.filter(pk=instance.book_id).values_list('title', 'author__name').first()
+                if book:
+                    self._set_book(instance.book_id, *book)
+            self._set_quote(instance.id, instance.book_id, instance.text)
+
+    def _delete_quote(self, quote_id):
+        if quote_id in self._docs:
+            self._remove(quote_id)
+            book_id, _ = self._docs.pop(quote_id)
+            self._book_docs[book_id].discard(quote_id)
+
+    def _quotes_deleted(self, sender, rows, **kwargs):
+        with self._lock:
+            if self._built:
+                for row in rows:
+                    self._delete_quote(row['id'])
+
+    def _quotes_moved(self, sender, rows, book, **kwargs):
+        with self._lock:
+            if not self._built:
+                return
+            if book.id not in self._books:
+                self._set_book(book.id, book.title, book.author.name)
+            for row in rows:
+                if row['id'] not in self._docs:
+                    continue
+                self._remove(row['id'])
+                old_book_id, text_words = self._docs[row['id']]
+                self._book_docs[old_book_id].discard(row['id'])
+                self._docs[row['id']] = (book.id, text_words)
+                self._book_docs[book.id].add(row['id'])
+                self._add(row['id'])
+
+    def _reindex_book(self, book_id, title, author):
+        quote_ids = self._book_docs.get(book_id, ())
+        for quote_id in quote_ids:
+            self._remove(quote_id)
+        self._set_book(book_id, title, author)
+        for quote_id in quote_ids:
+            self._add(quote_id)
+
+    def _book_saved(self, sender, instance, raw=False, **kwargs):
+        with self._lock:
+            if not self._built:
+                return
+            if raw:
+                # the author may not have been loaded yet either
+                author = Author.objects.filter(pk=instance.author_id).values_list('name', flat=True).first()
+            else:
+                author = instance.author.name
+            self._reindex_book(instance.id, instance.title, author)
+
+    def _book_deleted(self, sender, instance, **kwargs):
+        # its quotes are deleted along with it, without signals of their own
+        with self._lock:
+            if not self._built:
+                return
+            for quote_id in list(self._book_docs.pop(instance.id, ())):
+                self._remove(quote_id)
+                self._docs.pop(quote_id, None)
+            self._books.pop(instance.id, None)
+
+    def _author_saved(self, sender, instance, **kwargs):
+        with self._lock:
+            if not self._built:
+                return
+            for book_id, title in instance.books.values_list('id', 'title'):
+                self._reindex_book(book_id, title, instance.name)
+
+    def _expand(self, word, prefix):
+        if not prefix:
+            return [word] if word in self._postings else []
+        return [term for term in self._postings if term.startswith(word)]
+
+    def _has_phrase(self, quote_id, term):
+        size = len(term.words)
+        *head, last = term.words
+        for words in self._fields(quote_id):
+            for start in range(len(words) - size + 1):
+                window = words[start:start + size]
+                if list(window[:-1]) == head and (window[-1].startswith(last) if term.prefix else window[-1] == last):
+                    return True
+        return False
+
+    def _matches(self, term):
+        """Quote ids matching a term, and the index terms it matched on."""
+        matched_terms = []
+        matches = None
+        for position, word in enumerate(term.words):
+            terms = self._expand(word, term.prefix and position == len(term.words) - 1)
+            ids = set().union(*(self._postings[t] for t in terms))
+            matches = ids if matches is None else matches & ids
+            matched_terms += terms
+        if len(term.words) > 1:
+            matches = {quote_id for quote_id in matches if self._has_phrase(quote_id, term)}
+        return matches, matched_terms
+
+    def _evaluate(self, clauses):
+        matches = None
+        excluded = set()
+        scored_terms = set()
+        for clause in clauses:
+            clause_matches = set()
+            for term in clause.terms:
+                term_matches, terms = self._matches(term)
+                clause_matches |= term_matches
+                if not clause.negated:
+                    scored_terms.update(terms)
+            if clause.negated:
+                excluded |= clause_matches
+            else:
+                matches = clause_matches if matches is None else matches & clause_matches
+        return (matches or set()) - excluded, scored_terms
+
+    def scores(self, query, candidates=None):
+        """BM25 scores of every quote matching `query` (see
+        quotes.search.query), optionally only among the `candidates` quote
+        ids."""
+        clauses = parse(query)
+        with self._lock:
+            if not self._built:
+                self._build()
+            if not positive(clauses) or not self._lengths:
+                return {}
+
+            matches, terms = self._evaluate(clauses)
+            if candidates is not None:
+                matches &= candidates
+
+            total = len(self._lengths)
+            average_length = sum(self._lengths.values()) / total
+            scores = dict.fromkeys(matches, 0.0)
+            for term in terms:
+                term_postings = self._postings[term]
+                idf = math.log(1 + (total - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+                for quote_id in matches:
+                    frequency = term_postings.get(quote_id)
+                    if not frequency:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[quote_id] / average_length)
+                    scores[quote_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+            return scores
+
+    def search(self, quotes, query):
+        # scoring only what the queryset allows keeps the ranking CASE small
+        scores = self.scores(query, set(quotes.values_list('pk', flat=True)))
+        if not scores:
+            return quotes.none()
+
+        rank = Case(*(When(pk=pk, then=Value(score)) for pk, score in scores.items()), output_field=FloatField())
+        return quotes.filter(pk__in=scores.keys()).annotate(rank=rank).order_by('-rank')
@@ -0,0 +1,54 @@
+"""Parsing of the web search style syntax accepted by every search backend.
+
+    winter light        quotes with both words
+    "winter light"      the words next to each other, in this order
+    winter OR summer    either word, OR binds tighter than the implicit AND
+    -winter             quotes without the word or phrase
+
+The last word also matches as a prefix, as long as it is neither quoted nor
+followed by a space, so that results can be shown while typing. A query with
+nothing but exclusions matches nothing.
+"""
+import re
+from collections import namedtuple
+
+from .base import tokenize
+
+# words of a quoted phrase or of a single unquoted word
+Term = namedtuple('Term', 'words prefix')
+# terms of which any one has to match, or none of them when negated
+Clause = namedtuple('Clause', 'terms negated')
+
+CHUNK_RE = re.compile(r'(-?)"([^"]*)"?|(\S+)')
+
+
+def parse(text):
+    """Parse a search into a list of clauses that all have to match."""
+    clauses = []
+    pending_or = False
+    chunks = list(CHUNK_RE.finditer(text or ''))
+    for i, chunk in enumerate(chunks):
+        negated, phrase, word = chunk.groups()
+        if word is not None and word.upper() == 'OR':
+            pending_or = bool(clauses) and not clauses[-1].negated
+            continue
+        if word is not None and word.startswith('-') and len(word) > 1:
+            negated, word = '-', word[1:]
+
+        words = tuple(tokenize(phrase if word is None else word))
+        if not words:
+            continue
+        is_last = i == len(chunks) - 1
+        prefix = word is not None and is_last and not text[chunk.end():]
+        term = Term(words, prefix)
+
+        if pending_or and not negated:
+            clauses[-1] = clauses[-1]._replace(terms=clauses[-1].terms + (term,))
+        else:
+            clauses.append(Clause((term,), bool(negated)))
+        pending_or = False
+    return clauses
+
+
+def positive(clauses):
+    return [clause for clause in clauses if not clause.negated]
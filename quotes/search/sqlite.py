@@ -0,0 +1,46 @@
+from .base import SearchBackend
+from .query import parse, positive
+
+# The FTS5 table and the triggers keeping it in sync with quotes_quote and
+# quotes_book are created by migration 0006 when running on SQLite.
+FTS_TABLE = 'quotes_quote_fts'
+
+
+def _term(term):
+    # only quoted strings reach FTS5, so operators in user input are never
+    # interpreted by it
+    phrase = '"' + ' '.join(term.words) + '"'
+    if term.prefix:
+        # prefixes are not stemmed, so a complete word needs its own match
+        return f'({phrase} OR {phrase}*)'
+    return phrase
+
+
+def match_expression(query):
+    clauses = parse(query)
+    if not positive(clauses):
+        return ''
+
+    def clause_expression(clause):
+        return '(' + ' OR '.join(_term(term) for term in clause.terms) + ')'
+
+    match = ' AND '.join(clause_expression(clause) for clause in positive(clauses))
+    for clause in clauses:
+        if clause.negated:
+            match += ' NOT ' + clause_expression(clause)
+    return match
+
+
+class SQLiteSearchBackend(SearchBackend):
+    def search(self, quotes, query):
+        match = match_expression(query)
+        if not match:
+            return quotes.none()
+
+        return quotes.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = quotes_quote.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            # bm25() is lower for better matches
+            select={'rank': f'-bm25({FTS_TABLE})'},
+        ).order_by('-rank')
@@ -0,0 +1,15 @@
+from django.dispatch import Signal
+
+# Sent after quotes have been changed with a single UPDATE or DELETE, which
+# bypasses the usual model signals: quotes_moved by quotes.bulk, and
+# quotes_deleted whenever quotes are deleted, through Quote.delete() or the
+# QuerySet.delete() of Quote.objects. `rows` holds the id, created_by_id,
+# book_id and created timestamp of every affected quote, as they were before
+# the change.
+#
+# quotes_deleted stands in for post_delete: without any post_delete receivers
+# quotes can be removed with a single DELETE rather than one at a time.
+ROW_FIELDS = ('id', 'created_by_id', 'book_id', 'created')
+
+quotes_moved = Signal(providing_args=['rows', 'book'])
+quotes_deleted = Signal(providing_args=['rows'])
@@ -0,0 +1,67 @@
+// Loads the next page of cards as the "More" link scrolls into view,
+// appending the card fragments instead of navigating to a whole new page.
+// Without JavaScript the link is still a plain link to the next page.
+(function () {
+    'use strict';
+
+    if (!('IntersectionObserver' in window) || !('fetch' in window)) {
+        return;
+    }
+
+    document.querySelectorAll('a.next-page').forEach(function (link) {
+        var target = document.getElementById(link.dataset.target);
+        var loading = false;
+        var failed = false;
+        var observer = new IntersectionObserver(function (entries) {
+            if (entries.some(function (entry) { return entry.isIntersecting; })) {
+                loadMore();
+            }
+        }, { rootMargin: '400px' });
+
+        function loadMore() {
+            if (loading) {
+                return;
+            }
+            loading = true;
+
+            var url = new URL(link.href);
+            url.searchParams.set('fragment', '1');
+            fetch(url, { credentials: 'same-origin' })
+                .then(function (response) {
+                    if (!response.ok) {
+                        throw new Error(response.statusText);
+                    }
+                    var next = response.headers.get('X-Next-Page');
+                    return response.text().then(function (html) {
+                        target.insertAdjacentHTML('beforeend', html);
+                        if (next) {
+                            link.href = next;
+                            // observe again so a link that is still in view loads the next page too
+                            observer.unobserve(link);
+                            observer.observe(link);
+                        } else {
+                            observer.disconnect();
+                            link.parentNode.remove();
+                        }
+                    });
+                })
+                .catch(function () {
+                    // leave the link in place to fall back to a full page load
+                    failed = true;
+                    observer.disconnect();
+                })
+                .then(function () {
+                    loading = false;
+                });
+        }
+
+        link.addEventListener('click', function (event) {
+            if (failed) {
+                return;
+            }
+            event.preventDefault();
+            loadMore();
+        });
+        observer.observe(link);
+    });
+})();
@@ -0,0 +1,87 @@
+// Shows the best matches below the search box while typing, fetched from the
+// JSON endpoint in the form's data-live-search attribute. Requests wait for a
+// pause in typing and a newer search cancels the one still in flight.
+// Submitting the form still shows the full list of results.
+(function () {
+    'use strict';
+
+    var DELAY = 250;
+    var MIN_LENGTH = 2;
+
+    if (!('fetch' in window) || !('AbortController' in window)) {
+        return;
+    }
+
+    document.querySelectorAll('form[data-live-search]').forEach(function (form) {
+        var input = form.querySelector('input[name="search"]');
+        var results = document.getElementById(form.dataset.results);
+        var timer = null;
+        var controller = null;
+        var lastSearch = input.value;
+
+        function clear() {
+            results.innerHTML = '';
+            results.hidden = true;
+        }
+
+        function render(data) {
+            results.innerHTML = '';
+            data.results.forEach(function (result) {
+                var item = document.createElement('li');
+                var link = document.createElement('a');
+                var source = document.createElement('small');
+                link.href = result.url;
+                link.textContent = result.text;
+                source.textContent = result.book + ' by ' + result.author;
+                link.appendChild(source);
+                item.appendChild(link);
+                results.appendChild(item);
+            });
+            results.hidden = !data.results.length;
+        }
+
+        function update() {
+            var value = input.value;
+            if (value === lastSearch) {
+                return;
+            }
+            lastSearch = value;
+            if (controller) {
+                controller.abort();
+            }
+            if (value.trim().length < MIN_LENGTH) {
+                clear();
+                return;
+            }
+
+            controller = new AbortController();
+            var url = new URL(form.dataset.liveSearch, window.location.href);
+            url.searchParams.set('search', value);
+            fetch(url, { credentials: 'same-origin', signal: controller.signal })
+                .then(function (response) {
+                    if (!response.ok) {
+                        throw new Error(response.statusText);
+                    }
+                    return response.json();
+                })
+                .then(function (data) {
+                    // a response for an older search may still arrive
+                    if (data.search === input.value) {
+                        render(data);
+                    }
+                })
+                .catch(function () {});
+        }
+
+        input.setAttribute('autocomplete', 'off');
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(update, DELAY);
+        });
+        input.addEventListener('keydown', function (event) {
+            if (event.key === 'Escape') {
+                clear();
+            }
+        });
+    });
+})();
@@ -0,0 +1,171 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Quote, QuoteStat
+from .signals import quotes_deleted, quotes_moved
+
+TOP_LIMIT = 5
+
+
+def month_of(timestamp):
+    return timezone.localtime(timestamp).date().replace(day=1)
+
+
+def adjust(user_id, book_id, month, delta):
+    """Add `delta` to the rollup row for (user, book, month), creating or
+    removing the row as needed."""
+    if not delta:
+        return
+
+    rows = QuoteStat.objects.filter(created_by_id=user_id, book_id=book_id, month=month)
+    with transaction.atomic():
+        if delta < 0:
+            # rows that would drop to zero are removed rather than kept around
+            if not rows.filter(count__gt=-delta).update(count=F('count') + delta):
+                rows.delete()
+            return
+
+        if rows.update(count=F('count') + delta):
+            return
+        try:
+            with transaction.atomic():
+                QuoteStat.objects.create(created_by_id=user_id, book_id=book_id, month=month, count=delta)
+        except IntegrityError:
+            # somebody else created the row in the meantime
+            rows.update(count=F('count') + delta)
+
+
+STAT_FIELDS = ('created_by_id', 'book_id')
+
+
+def _stat_key(values):
+    return tuple(values[field] for field in STAT_FIELDS)
+
+
+@receiver(pre_save, sender=Quote, dispatch_uid='quotes.stats.quote_saving')
+def quote_saving(sender, instance, raw=False, **kwargs):
+    # a quote loaded with only() or defer() doesn't know where it was counted,
+    # so look that up before it is overwritten
+    loaded = getattr(instance, '_loaded_values', None)
+    if raw or loaded is None:
+        return
+    missing = [field for field in STAT_FIELDS if field not in loaded]
+    if missing:
+        loaded.update(Quote.objects.filter(pk=instance.pk).values(*missing).first() or {})
+
+
+@receiver(post_save, sender=Quote, dispatch_uid='quotes.stats.quote_saved')
+def quote_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    current = {'created_by_id': instance.created_by_id, 'book_id': instance.book_id}
+    month = month_of(instance.created)
+    if created:
+        adjust(instance.created_by_id, instance.book_id, month, 1)
+    else:
+        previous = {**current, **getattr(instance, '_loaded_values', {})}
+        if _stat_key(previous) != _stat_key(current):
+            adjust(*_stat_key(previous), month, -1)
+            adjust(*_stat_key(current), month, 1)
+
+    if not hasattr(instance, '_loaded_values'):
+        instance._loaded_values = {}
+    instance._loaded_values.update(current)
+
+
+def _adjust_all(deltas):
+    for (user_id, book_id, month), delta in deltas.items():
+        adjust(user_id, book_id, month, delta)
+
+
+@receiver(quotes_moved, dispatch_uid='quotes.stats.quotes_moved')
+def quotes_moved_in_bulk(sender, rows, book, **kwargs):
+    deltas = Counter()
+    for row in rows:
+        month = month_of(row['created'])
+        deltas[(row['created_by_id'], row['book_id'], month)] -= 1
+        deltas[(row['created_by_id'], book.id, month)] += 1
+    _adjust_all(deltas)
+
+
+@receiver(quotes_deleted, dispatch_uid='quotes.stats.quotes_deleted')
+def quotes_deleted_in_bulk(sender, rows, **kwargs):
+    deltas = Counter()
+    for row in rows:
+        deltas[(row['created_by_id'], row['book_id'], month_of(row['created']))] -= 1
+    _adjust_all(deltas)
+
+
+def backfill(users=None):
+    """Rebuild the rollup from scratch, optionally only for some users.
+    Returns the number of rollup rows written."""
+    quotes = Quote.objects.all()
+    stats = QuoteStat.objects.all()
+    if users is not None:
+        quotes = quotes.filter(created_by__in=users)
+        stats = stats.filter(created_by__in=users)
+
+    rows = quotes.annotate(
+        month=TruncMonth('created', output_field=DateField())
+    ).values('created_by', 'book', 'month').annotate(count=Count('id')).order_by()
+
+    with transaction.atomic():
+        stats.delete()
+        created = QuoteStat.objects.bulk_create(
+            (QuoteStat(created_by_id=row['created_by'], book_id=row['book'], month=row['month'], count=row['count']) for row in rows.iterator()),
+            batch_size=500,
+        )
+    return len(created)
+
+
+def _month_index(month):
+    return month.year * 12 + month.month - 1
+
+
+def streaks(months, today=None):
+    """Return the (current, longest) run of consecutive months with quotes.
+    The current streak is still alive if the latest month is this one or the
+    one before it."""
+    today = today or timezone.localdate()
+    longest = run = 0
+    previous = None
+    for index in sorted({_month_index(month) for month in months}):
+        run = run + 1 if previous is not None and index == previous + 1 else 1
+        longest = max(longest, run)
+        previous = index
+
+    current = run if previous is not None and previous >= _month_index(today) - 1 else 0
+    return current, longest
+
+
+def summary(user, top=TOP_LIMIT):
+    stats = QuoteStat.objects.filter(created_by=user)
+
+    per_month = list(stats.values('month').annotate(count=Sum('count')).order_by('-month'))
+    top_books = list(
+        stats.values('book', 'book__title', 'book__author__name')
+        .annotate(count=Sum('count'))
+        .order_by('-count', 'book__title')[:top]
+    )
+    top_authors = list(
+        stats.values('book__author', 'book__author__name')
+        .annotate(count=Sum('count'))
+        .order_by('-count', 'book__author__name')[:top]
+    )
+    current_streak, longest_streak = streaks([row['month'] for row in per_month])
+
+    return {
+        'total': sum(row['count'] for row in per_month),
+        'per_month': per_month,
+        'top_books': top_books,
+        'top_authors': top_authors,
+        'current_streak': current_streak,
+        'longest_streak': longest_streak,
+    }
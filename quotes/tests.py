@@ -1,19 +1,37 @@
 from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy
+from django.utils import timezone
 from django.utils.html import escape
 from freezegun import freeze_time
 
 import datetime
+import json
+import marshal
+from io import StringIO
+from urllib.parse import urlencode
+from unittest import skipUnless
 
-from .models import Quote, Book
+from . import bulk, digests, partitioning
+from .management.commands.importtime import group_imports, parse_importtime
+from .middleware import format_stats
+from .models import Author, DigestDelivery, Quote, Book, QuoteStat, RequestProfile, normalize_author_name
+from .search.memory import InMemorySearchBackend
+from .search.postgres import PostgresSearchBackend
+from .search.sqlite import SQLiteSearchBackend
 
 User = get_user_model()
 
 QUOTES_URLS = {
     'new-quote': lambda: reverse_lazy('quotes:new-quote'),
     'list-quote': lambda: reverse_lazy('quotes:list-quote'),
+    'search-quote': lambda: reverse_lazy('quotes:search-quote'),
     'update-quote': lambda pk: reverse_lazy('quotes:update-quote', kwargs={ 'pk': pk }),
     'delete-quote': lambda pk: reverse_lazy('quotes:delete-quote', kwargs={ 'pk': pk }),
     'detail-quote': lambda pk: reverse_lazy('quotes:detail-quote', kwargs={ 'pk': pk }),
@@ -295,7 +313,7 @@ class TestBookJourneys(TestCase):
             with freeze_time(f"2030-01-{i}"):
                 new_book = Book(
                     title=f"Book {i}",
-                    author=f"Ms. Writer",
+                    author=Author.objects.resolve("Ms. Writer", tiny),
                     created_by=tiny
                 )
                 new_book.save()
@@ -304,7 +322,7 @@ class TestBookJourneys(TestCase):
         with freeze_time(f"2030-02-01"):
             new_book = Book(
                 title=f"Big life",
-                author=f"Big Boii",
+                author=Author.objects.resolve("Big Boii", bigboii),
                 created_by=bigboii
             )
             new_book.save()
@@ -323,7 +341,7 @@ class TestBookJourneys(TestCase):
             res = self.client.post(BOOKS_URLS['new-book'](), data={'title': "Mr Writer", 'author': 'Ms Writer'}, follow=True)
         
         # raises a DoesNotExist exception if this query fails
-        book = Book.objects.get(title='Mr Writer', author='Ms Writer')
+        book = Book.objects.get(title='Mr Writer', author__name='Ms Writer')
         expected_timestamp = datetime.datetime(2020, 1, 1, 0, 0, 0)
         self.assertTrue(all([
             book.created.year == expected_timestamp.year,
@@ -397,4 +415,730 @@ class TestBookJourneys(TestCase):
         self.client.force_login(tiny)
 
         res = self.client.post(BOOKS_URLS['delete-book'](1), follow=True)
-        self.assertEqual(404, res.status_code)
\ No newline at end of file
+        self.assertEqual(404, res.status_code)
+
+STATS_URL = lambda: reverse_lazy('quotes:stats')
+
+class TestStatsJourneys(TestCase):
+    fixtures = ['quotes', 'users']
+
+    def setUp(self):
+        call_command('backfill_quote_stats', stdout=StringIO())
+
+    def stat_counts(self, user):
+        return {(s.book_id, s.month): s.count for s in QuoteStat.objects.filter(created_by=user)}
+
+    def test_must_log_in_to_access_stats(self):
+        res = self.client.get(STATS_URL(), follow=True)
+        self.assertContains(res, "<h1>Sign In</h1>")
+
+    def test_backfill_rolls_up_quotes_by_book_and_month(self):
+        tiny = User.objects.get(username="tiny")
+        self.assertEqual({
+            (2, datetime.date(2019, 10, 1)): 3,
+            (3, datetime.date(2019, 11, 1)): 1,
+        }, self.stat_counts(tiny))
+
+    def test_stats_follow_quote_create_update_and_delete(self):
+        tiny = User.objects.get(username="tiny")
+        self.client.force_login(tiny)
+
+        with freeze_time('2019-11-20'):
+            self.client.post(QUOTES_URLS['new-quote'](), data={'book': 3, 'text': "Fresh", 'page': 2})
+        self.assertEqual(2, self.stat_counts(tiny)[(3, datetime.date(2019, 11, 1))])
+
+        # moving a quote to another book moves it in the rollup too
+        self.client.post(QUOTES_URLS['update-quote'](4), data={'book': 3, 'text': "Moved", 'page': 100})
+        counts = self.stat_counts(tiny)
+        self.assertEqual(2, counts[(2, datetime.date(2019, 10, 1))])
+        self.assertEqual(1, counts[(3, datetime.date(2019, 10, 1))])
+
+        self.client.post(QUOTES_URLS['delete-quote'](4))
+        self.assertNotIn((3, datetime.date(2019, 10, 1)), self.stat_counts(tiny))
+
+        # the incremental rollup matches a full rebuild
+        incremental = self.stat_counts(tiny)
+        call_command('backfill_quote_stats', 'tiny', stdout=StringIO())
+        self.assertEqual(incremental, self.stat_counts(tiny))
+
+    def test_stats_follow_queryset_and_admin_deletes(self):
+        tiny = User.objects.get(username="tiny")
+        Quote.objects.filter(pk__in=[4, 5]).delete()
+        self.assertEqual(1, self.stat_counts(tiny)[(2, datetime.date(2019, 10, 1))])
+
+        bigboii = User.objects.get(username="bigboii")
+        self.client.force_login(bigboii)
+        self.client.post(reverse_lazy('admin:quotes_quote_changelist'), data={
+            'action': 'delete_selected', 'post': 'yes', '_selected_action': [1, 2],
+        })
+        self.assertFalse(Quote.objects.filter(pk__in=[1, 2]).exists())
+        self.assertEqual({}, self.stat_counts(bigboii))
+
+    def test_stats_follow_saves_of_partially_loaded_quotes(self):
+        tiny = User.objects.get(username="tiny")
+        before = self.stat_counts(tiny)
+
+        Quote.objects.only('text').get(pk=4).save()
+        self.assertEqual(before, self.stat_counts(tiny))
+
+        quote = Quote.objects.only('text').get(pk=4)
+        quote.book_id = 3
+        quote.save()
+        counts = self.stat_counts(tiny)
+        self.assertEqual(2, counts[(2, datetime.date(2019, 10, 1))])
+        self.assertEqual(1, counts[(3, datetime.date(2019, 10, 1))])
+
+    def test_stats_page_shows_summary(self):
+        tiny = User.objects.get(username="tiny")
+        self.client.force_login(tiny)
+
+        with freeze_time('2019-12-05'):
+            res = self.client.get(STATS_URL())
+        self.assertEqual(4, res.context_data['total'])
+        self.assertEqual(2, res.context_data['current_streak'])
+        self.assertEqual(2, res.context_data['longest_streak'])
+        self.assertEqual("Another book", res.context_data['top_books'][0]['book__title'])
+        self.assertEqual("Some guy", res.context_data['top_authors'][0]['book__author__name'])
+        self.assertInHTML("<dt>October 2019</dt>", res.rendered_content)
+
+    def test_stats_page_query_count_does_not_grow_with_library(self):
+        tiny = User.objects.get(username="tiny")
+        self.client.force_login(tiny)
+        self.client.get(STATS_URL())
+
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(STATS_URL())
+        for i in range(30):
+            Quote(book=Book.objects.get(pk=2), text=f"Quote {i}", created_by=tiny).save()
+        with self.assertNumQueries(len(before)):
+            self.client.get(STATS_URL())
+
+
+class SearchBackendConformance:
+    # Behaviour every quotes.search backend must share. Subclasses set
+    # `backend_class` and mix this into a TestCase.
+    fixtures = ['quotes', 'users']
+    backend_class = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.backend = cls.backend_class()
+
+    def setUp(self):
+        self.bigboii = User.objects.get(username='bigboii')
+        self.tiny = User.objects.get(username='tiny')
+
+    def search(self, user, query):
+        return [q.text for q in self.backend.search(Quote.objects.filter(created_by=user), query)]
+
+    def test_matches_quote_text(self):
+        self.assertEqual(["This is another quote"], self.search(self.bigboii, "another"))
+
+    def test_matches_book_title_and_author(self):
+        self.assertCountEqual(["This is a quote", "This is another quote"], self.search(self.bigboii, "Sprint"))
+        self.assertCountEqual(["This is a quote", "This is another quote"], self.search(self.bigboii, "Jake Knapp"))
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(["This is another quote"], self.search(self.bigboii, "another Knapp"))
+        self.assertEqual([], self.search(self.bigboii, "another Skinner"))
+
+    def test_no_match_and_blank_queries_return_nothing(self):
+        self.assertEqual([], self.search(self.bigboii, "zebra"))
+        self.assertEqual([], self.search(self.bigboii, "!!"))
+
+    def test_only_searches_given_queryset(self):
+        self.assertEqual([], self.search(self.tiny, "Sprint"))
+
+    def test_ordered_by_rank(self):
+        Quote(book=Book.objects.get(pk=1), text="This is another another quote", page=37, created_by=self.bigboii).save()
+        self.assertEqual(["This is another another quote", "This is another quote"], self.search(self.bigboii, "another"))
+
+    def test_reflects_changes_to_quotes_and_books(self):
+        self.search(self.tiny, "sucks")
+
+        quote = Quote.objects.get(pk=4)
+        quote.text = "Actually it's a masterpiece"
+        quote.save()
+        self.assertEqual(["Actually it's a masterpiece"], self.search(self.tiny, "masterpiece"))
+
+        book = Book.objects.get(pk=3)
+        book.title = "Original Pirate Material"
+        book.save()
+        self.assertEqual(["New book, new me!"], self.search(self.tiny, "pirate"))
+
+        Quote.objects.get(pk=6).delete()
+        self.assertEqual([], self.search(self.tiny, "pirate"))
+
+    def test_quoted_phrases_match_words_in_order(self):
+        self.assertEqual(["No wait, it definitely sucks"], self.search(self.tiny, '"definitely sucks"'))
+        self.assertEqual([], self.search(self.tiny, '"sucks definitely"'))
+
+    def test_excluded_words_and_phrases(self):
+        self.assertEqual(["This book sucks"], self.search(self.tiny, "sucks -definitely"))
+        self.assertEqual(["This book sucks"], self.search(self.tiny, 'sucks -"it definitely"'))
+        # exclusions alone match nothing
+        self.assertEqual([], self.search(self.tiny, "-sucks"))
+
+    def test_or_matches_either_side(self):
+        self.assertEqual(["No wait, it definitely sucks"], self.search(self.tiny, "masterpiece OR definitely"))
+        self.assertCountEqual(["Actually it's quite good", "New book, new me!"], self.search(self.tiny, '"quite good" or Skinner'))
+        # OR binds tighter than the implicit AND
+        self.assertEqual(["New book, new me!"], self.search(self.tiny, "Skinner good OR new"))
+
+    def test_last_word_matches_as_prefix_while_typing(self):
+        self.assertEqual(["No wait, it definitely sucks"], self.search(self.tiny, "defin"))
+        self.assertEqual(["No wait, it definitely sucks"], self.search(self.tiny, "definitely"))
+        self.assertEqual([], self.search(self.tiny, "defin "))
+        self.assertEqual([], self.search(self.tiny, '"defin"'))
+
+    def test_operators_in_input_are_not_interpreted(self):
+        self.assertCountEqual(["This book sucks", "No wait, it definitely sucks"], self.search(self.tiny, 'sucks & | ! ( ) * : "'))
+
+
+@skipUnless(connection.vendor == 'postgresql', "requires PostgreSQL")
+class TestPostgresSearchBackend(SearchBackendConformance, TestCase):
+    backend_class = PostgresSearchBackend
+
+
+@skipUnless(connection.vendor == 'sqlite', "requires SQLite")
+class TestSQLiteSearchBackend(SearchBackendConformance, TestCase):
+    backend_class = SQLiteSearchBackend
+
+
+class TestInMemorySearchBackend(SearchBackendConformance, TestCase):
+    backend_class = InMemorySearchBackend
+
+    def setUp(self):
+        super().setUp()
+        # the index outlives the transaction each test is rolled back in
+        self.backend.reset()
+
+    def test_forgets_quotes_deleted_along_with_their_book(self):
+        self.search(self.tiny, "sucks")
+        Book.objects.get(pk=2).delete()
+        self.assertNotIn(4, self.backend._docs)
+        self.assertNotIn("sucks", self.backend._postings)
+
+
+class TestListFragments(TestCase):
+    fixtures = ['quotes', 'users']
+
+    def setUp(self):
+        self.tiny = User.objects.get(username="tiny")
+        self.client.force_login(self.tiny)
+
+    def test_quote_list_fragment_only_contains_cards(self):
+        for i in range(25):
+            Quote(book=Book.objects.get(pk=2), text=f"Paged quote {i}", created_by=self.tiny).save()
+
+        res = self.client.get(QUOTES_URLS['list-quote']() + '?fragment=1')
+        self.assertNotContains(res, "<html")
+        self.assertNotContains(res, "search_form")
+        self.assertContains(res, '<article class="quote card', count=20)
+        last = res.context['quote_list'][19]
+        self.assertEqual(f"{QUOTES_URLS['list-quote']()}?{urlencode({'after': f'{last.modified},{last.id}'})}", res['X-Next-Page'])
+
+        res = self.client.get(res['X-Next-Page'] + '&fragment=1')
+        self.assertContains(res, '<article class="quote card', count=9)
+        self.assertFalse(res.has_header('X-Next-Page'))
+
+    def test_quote_list_pages_are_not_shifted_by_changes_while_scrolling(self):
+        for i in range(25):
+            Quote(book=Book.objects.get(pk=2), text=f"Paged quote {i}", created_by=self.tiny).save()
+
+        res = self.client.get(QUOTES_URLS['list-quote']())
+        first_page = [quote.id for quote in res.context['quote_list']]
+        # moves a card from the first page to the top, and adds one above it
+        Quote.objects.get(pk=first_page[-1]).save()
+        Quote(book=Book.objects.get(pk=2), text="Added while scrolling", created_by=self.tiny).save()
+
+        res = self.client.get(res.context['next_page_url'] + '&fragment=1')
+        next_page = [quote.id for quote in res.context['quote_list']]
+        self.assertEqual(9, len(next_page))
+        self.assertFalse(set(first_page) & set(next_page))
+
+    def test_invalid_cursor_is_not_found(self):
+        res = self.client.get(QUOTES_URLS['list-quote']() + '?after=yesterday,1')
+        self.assertEqual(404, res.status_code)
+
+    def test_quote_list_links_to_next_page(self):
+        for i in range(25):
+            Quote(book=Book.objects.get(pk=2), text=f"Paged quote {i}", created_by=self.tiny).save()
+
+        res = self.client.get(QUOTES_URLS['list-quote']() + '?search=paged')
+        self.assertContains(res, f'href="{QUOTES_URLS["list-quote"]()}?search=paged&amp;page=2"')
+        self.assertContains(res, 'infinite_scroll.js')
+
+        res = self.client.get(QUOTES_URLS['list-quote']() + '?search=sucks')
+        self.assertNotContains(res, 'infinite_scroll.js')
+
+    def test_book_list_fragment_only_contains_cards(self):
+        for i in range(25):
+            Book(title=f"Book {i}", author=Author.objects.resolve("Ms. Writer", self.tiny), created_by=self.tiny).save()
+
+        res = self.client.get(BOOKS_URLS['list-book']() + '?page=2&fragment=1')
+        self.assertNotContains(res, "<html")
+        self.assertContains(res, '<article class="book card', count=7)
+        self.assertFalse(res.has_header('X-Next-Page'))
+
+
+AUTHORS_URLS = {
+    'list-author': lambda: reverse_lazy('quotes:list-author'),
+    'detail-author': lambda pk: reverse_lazy('quotes:detail-author', kwargs={ 'pk': pk }),
+}
+
+class TestAuthorJourneys(TestCase):
+    fixtures = ['quotes', 'users']
+
+    def test_must_log_in_to_access_authors(self):
+        res_list = [
+            self.client.get(AUTHORS_URLS['list-author'](), follow=True),
+            self.client.get(AUTHORS_URLS['detail-author'](1), follow=True),
+        ]
+        for res in res_list:
+            self.assertContains(res, "<h1>Sign In</h1>")
+
+    def test_author_names_are_normalized(self):
+        self.assertEqual("gabriel garcia marquez", normalize_author_name("  Gabriel García-Márquez "))
+
+    def test_spelling_variants_resolve_to_the_same_author(self):
+        tiny = User.objects.get(username="tiny")
+        self.client.force_login(tiny)
+
+        self.client.post(BOOKS_URLS['new-book'](), data={'title': "Another one", 'author': 'SOME   guy'})
+        self.client.post(BOOKS_URLS['new-book'](), data={'title': "And another", 'author': 'Some Guy.'})
+
+        author = Author.objects.get(pk=2)
+        self.assertEqual("Some guy", author.name)
+        self.assertEqual(3, author.books.count())
+        self.assertEqual(1, Author.objects.filter(created_by=tiny, normalized_name="some guy").count())
+
+    def test_authors_are_not_shared_between_users(self):
+        bigboii = User.objects.get(username="bigboii")
+        self.client.force_login(bigboii)
+
+        self.client.post(BOOKS_URLS['new-book'](), data={'title': "His book", 'author': 'Some guy'})
+        self.assertEqual(2, Author.objects.filter(normalized_name="some guy").count())
+
+    def test_update_book_form_shows_author_name(self):
+        tiny = User.objects.get(username="tiny")
+        self.client.force_login(tiny)
+
+        res = self.client.get(BOOKS_URLS['update-book'](2))
+        self.assertContains(res, 'value="Some guy"')
+
+    def test_author_list_and_detail_show_users_books(self):
+        tiny = User.objects.get(username="tiny")
+        self.client.force_login(tiny)
+
+        res = self.client.get(AUTHORS_URLS['list-author']())
+        self.assertContains(res, "Some guy")
+        self.assertContains(res, "Mike Skinner")
+        self.assertNotContains(res, "Jake Knapp")
+
+        res = self.client.get(AUTHORS_URLS['detail-author'](2))
+        self.assertInHTML("<h1>Some guy</h1>", res.rendered_content)
+        self.assertContains(res, "Another book")
+        self.assertNotContains(res, "Brand new book")
+
+    def test_cannot_see_another_users_author(self):
+        tiny = User.objects.get(username="tiny")
+        self.client.force_login(tiny)
+
+        res = self.client.get(AUTHORS_URLS['detail-author'](1))
+        self.assertEqual(404, res.status_code)
+
+    def test_invalid_book_does_not_create_author(self):
+        tiny = User.objects.get(username="tiny")
+        self.client.force_login(tiny)
+
+        res = self.client.post(BOOKS_URLS['new-book'](), data={'title': "x" * 300, 'author': 'Nobody yet'})
+        self.assertEqual(200, res.status_code)
+        self.assertFalse(Author.objects.filter(normalized_name="nobody yet").exists())
+
+    def test_authors_without_books_are_removed(self):
+        tiny = User.objects.get(username="tiny")
+        self.client.force_login(tiny)
+        author = Book.objects.get(pk=3).author
+
+        self.client.post(BOOKS_URLS['update-book'](3), data={'title': "Renamed", 'author': 'Some guy'})
+        self.assertFalse(Author.objects.filter(pk=author.pk).exists())
+        self.assertEqual(404, self.client.get(AUTHORS_URLS['detail-author'](author.pk)).status_code)
+
+        self.client.post(BOOKS_URLS['delete-book'](2))
+        self.assertTrue(Author.objects.filter(pk=2).exists())
+        self.client.post(BOOKS_URLS['delete-book'](3))
+        self.assertFalse(Author.objects.filter(pk=2).exists())
+
+    def test_users_with_books_can_be_deleted(self):
+        User.objects.get(username="bigboii").delete()
+        self.assertFalse(Author.objects.filter(created_by__username="bigboii").exists())
+        self.assertFalse(Book.objects.filter(created_by__username="bigboii").exists())
+
+
+class TestRequestProfiling(TestCase):
+    fixtures = ['quotes', 'users']
+
+    def test_staff_can_profile_quotes_pages(self):
+        bigboii = User.objects.get(username="bigboii")
+        self.client.force_login(bigboii)
+
+        res = self.client.get(QUOTES_URLS['list-quote']() + '?_profile=1')
+        profile = RequestProfile.objects.get(pk=res['X-Profile-Id'])
+        self.assertEqual(200, profile.status_code)
+        self.assertEqual(f"{QUOTES_URLS['list-quote']()}?_profile=1", profile.path)
+        self.assertGreater(profile.query_count, 0)
+        self.assertEqual(profile.query_count, len(json.loads(profile.queries)))
+        self.assertTrue(any("quotes_quote" in query['sql'] for query in json.loads(profile.queries)))
+        self.assertIn("quotes/views.py", format_stats(profile, limit=None))
+
+        res = self.client.get(BOOKS_URLS['list-book'](), HTTP_X_PROFILE='1')
+        self.assertTrue(res.has_header('X-Profile-Id'))
+
+    def test_only_staff_and_flagged_quotes_requests_are_profiled(self):
+        tiny = User.objects.get(username="tiny")
+        self.client.force_login(tiny)
+        res = self.client.get(QUOTES_URLS['list-quote']() + '?_profile=1')
+        self.assertFalse(res.has_header('X-Profile-Id'))
+
+        bigboii = User.objects.get(username="bigboii")
+        self.client.force_login(bigboii)
+        self.client.get(QUOTES_URLS['list-quote']())
+        self.client.get('/?_profile=1')
+        self.assertEqual(0, RequestProfile.objects.count())
+
+    @override_settings(QUOTES_PROFILE_RETENTION=2)
+    def test_only_latest_profiles_are_kept(self):
+        bigboii = User.objects.get(username="bigboii")
+        self.client.force_login(bigboii)
+
+        ids = [self.client.get(QUOTES_URLS['detail-quote'](1) + '?_profile=1')['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual(sorted(ids[1:]), sorted(str(pk) for pk in RequestProfile.objects.values_list('pk', flat=True)))
+
+    def test_profiles_can_be_browsed_and_downloaded_in_admin(self):
+        bigboii = User.objects.get(username="bigboii")
+        self.client.force_login(bigboii)
+        pk = self.client.get(QUOTES_URLS['list-quote']() + '?_profile=1')['X-Profile-Id']
+
+        res = self.client.get(reverse_lazy('admin:quotes_requestprofile_changelist'))
+        self.assertContains(res, "Download .prof")
+        res = self.client.get(reverse_lazy('admin:quotes_requestprofile_change', args=(pk,)))
+        self.assertContains(res, "quotes_quote")
+
+        res = self.client.get(reverse_lazy('admin:quotes_requestprofile_download', args=(pk,)))
+        self.assertEqual(f'attachment; filename="request-{pk}.prof"', res['Content-Disposition'])
+        self.assertIsInstance(marshal.loads(res.content), dict)
+
+    def test_downloads_need_view_permission(self):
+        self.client.force_login(User.objects.get(username="bigboii"))
+        pk = self.client.get(QUOTES_URLS['list-quote']() + '?_profile=1')['X-Profile-Id']
+
+        self.client.force_login(User.objects.create(username="helper", is_staff=True))
+        res = self.client.get(reverse_lazy('admin:quotes_requestprofile_download', args=(pk,)))
+        self.assertEqual(403, res.status_code)
+
+
+class TestBulkQuoteActions(TestCase):
+    fixtures = ['quotes', 'users']
+
+    def setUp(self):
+        call_command('backfill_quote_stats', stdout=StringIO())
+        self.tiny = User.objects.get(username="tiny")
+        self.client.force_login(self.tiny)
+
+    def bulk(self, **data):
+        return self.client.post(reverse_lazy('quotes:bulk-quote'), data=data, follow=True)
+
+    def test_can_move_selected_quotes_to_another_book(self):
+        res = self.bulk(action='move', book=3, quotes=[3, 4], next=str(BOOKS_URLS['detail-book'](3)))
+
+        self.assertEqual([3], list(Quote.objects.filter(pk__in=[3, 4]).values_list('book', flat=True).distinct()))
+        self.assertContains(res, "Moved 2 quotes to Brand new book.")
+        self.assertInHTML("<h1>Brand new book</h1>", res.rendered_content)
+
+        # the statistics rollup follows the move
+        self.assertEqual(1, QuoteStat.objects.get(book=2).count)
+        self.assertEqual(2, QuoteStat.objects.get(book=3, month=datetime.date(2019, 10, 1)).count)
+
+    def test_moved_quotes_are_found_by_their_new_book(self):
+        self.bulk(action='move', book=3, quotes=[3])
+
+        res = self.client.get(QUOTES_URLS['list-quote']() + '?search=Skinner')
+        self.assertEqual(["New book, new me!", "This book sucks"], sorted(q.text for q in res.context_data['quote_list']))
+
+    def test_deletes_are_confirmed_first(self):
+        res = self.bulk(action='delete', quotes=[1, 3, 5], next=str(BOOKS_URLS['detail-book'](2)))
+
+        self.assertEqual(2, Quote.objects.filter(pk__in=[3, 5]).count())
+        self.assertContains(res, "Are you sure you want to delete 2 quotes?")
+        self.assertEqual([3, 5], res.context_data['quote_ids'])
+
+        # the confirmation page posts the same selection back
+        res = self.bulk(action='delete', quotes=res.context_data['quote_ids'], next=str(BOOKS_URLS['detail-book'](2)), confirm=1)
+        self.assertContains(res, "Deleted 2 quotes.")
+        self.assertInHTML("<h1>Another book</h1>", res.rendered_content)
+
+    def test_can_delete_selected_quotes(self):
+        res = self.bulk(action='delete', quotes=[3, 5], confirm=1)
+
+        self.assertEqual([4, 6], list(Quote.objects.filter(created_by=self.tiny).order_by('pk').values_list('pk', flat=True)))
+        self.assertContains(res, "Deleted 2 quotes.")
+        self.assertEqual(1, QuoteStat.objects.get(book=2).count)
+
+    def test_cannot_touch_other_users_quotes_or_books(self):
+        res = self.bulk(action='delete', quotes=[1, 2, 3], confirm=1)
+        self.assertContains(res, "Deleted 1 quote.")
+        self.assertEqual(2, Quote.objects.filter(pk__in=[1, 2]).count())
+
+        res = self.bulk(action='move', book=1, quotes=[4])
+        self.assertEqual(2, Quote.objects.get(pk=4).book_id)
+        self.assertContains(res, "Select a valid choice.")
+
+    def test_move_needs_a_book(self):
+        res = self.bulk(action='move', quotes=[4])
+        self.assertContains(res, "Choose the book to move the quotes to.")
+        self.assertEqual(2, Quote.objects.get(pk=4).book_id)
+
+    def test_single_statement_regardless_of_selection_size(self):
+        ids = [Quote.objects.create(book=Book.objects.get(pk=2), text=f"Quote {i}", created_by=self.tiny).pk for i in range(30)]
+
+        book = Book.objects.get(pk=3)
+        # the first move creates the statistics row for this month
+        bulk.move_quotes(Quote.objects.filter(pk=ids[0]), book)
+
+        with CaptureQueriesContext(connection) as few:
+            bulk.move_quotes(Quote.objects.filter(created_by=self.tiny, pk__in=ids[1:3]), book)
+        with CaptureQueriesContext(connection) as many:
+            bulk.move_quotes(Quote.objects.filter(created_by=self.tiny, pk__in=ids[3:20]), book)
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(1, sum(query['sql'].startswith('UPDATE "quotes_quote"') for query in many.captured_queries))
+
+        with CaptureQueriesContext(connection) as deleted:
+            self.assertEqual(30, bulk.delete_quotes(Quote.objects.filter(created_by=self.tiny, pk__in=ids)))
+        self.assertEqual(1, sum(query['sql'].startswith('DELETE FROM "quotes_quote"') for query in deleted.captured_queries))
+
+    def test_quote_list_and_book_detail_offer_bulk_actions(self):
+        res = self.client.get(QUOTES_URLS['list-quote']())
+        self.assertContains(res, 'id="bulk_quote_form"')
+        self.assertContains(res, 'form="bulk_quote_form"', count=4)
+
+        res = self.client.get(BOOKS_URLS['detail-book'](2))
+        self.assertContains(res, 'form="bulk_quote_form"', count=3)
+
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       400 |        900 | django.utils
+import time:       500 |        500 |     django.contrib.admin.options
+import time:      1000 |       1500 |   django.contrib.admin
+import time:       300 |       2700 | quotes.views
+"""
+
+class TestImportTime(TestCase):
+    def test_parses_importtime_output(self):
+        self.assertEqual([
+            ('_io', 120, 120),
+            ('django.utils', 400, 900),
+            ('django.contrib.admin.options', 500, 500),
+            ('django.contrib.admin', 1000, 1500),
+            ('quotes.views', 300, 2700),
+        ], parse_importtime(IMPORTTIME_OUTPUT))
+
+    def test_groups_self_time_by_installed_app(self):
+        imports = parse_importtime(IMPORTTIME_OUTPUT)
+        self.assertEqual([
+            ('django.contrib.admin', 1500, 2),
+            ('django', 400, 1),
+            ('quotes', 300, 1),
+            ('(standard library)', 120, 1),
+        ], group_imports(imports, ['django.contrib.admin', 'quotes']))
+
+
+class TestLiveSearch(TestCase):
+    fixtures = ['quotes', 'users']
+
+    def setUp(self):
+        self.client.force_login(User.objects.get(username="tiny"))
+
+    def live_search(self, query):
+        return self.client.get(QUOTES_URLS['search-quote'](), {'search': query}).json()
+
+    def test_returns_best_matches_as_json(self):
+        self.assertEqual({'search': 'defin', 'results': [{
+            'text': "No wait, it definitely sucks",
+            'book': "Another book",
+            'author': "Some guy",
+            'url': str(QUOTES_URLS['detail-quote'](5)),
+        }]}, self.live_search('defin'))
+
+    def test_only_searches_own_quotes(self):
+        self.assertEqual([], self.live_search('Sprint')['results'])
+        self.assertEqual([], self.live_search('  ')['results'])
+
+    def test_requires_login(self):
+        self.client.logout()
+        res = self.client.get(QUOTES_URLS['search-quote'](), {'search': 'sucks'})
+        self.assertEqual(302, res.status_code)
+
+    def test_quote_list_search_form_uses_it(self):
+        res = self.client.get(QUOTES_URLS['list-quote']())
+        self.assertContains(res, f'data-live-search="{QUOTES_URLS["search-quote"]()}"')
+
+    def test_quote_list_accepts_the_same_syntax(self):
+        res = self.client.get(QUOTES_URLS['list-quote'](), {'search': 'sucks -definitely'})
+        self.assertEqual(["This book sucks"], [q.text for q in res.context_data['quote_list']])
+
+
+@skipUnless(connection.vendor == 'postgresql', "requires PostgreSQL")
+class TestQuotePartitioning(TestCase):
+    fixtures = ['quotes', 'users']
+
+    def setUp(self):
+        self.tiny = User.objects.get(username="tiny")
+        self.client.force_login(self.tiny)
+
+    def test_quotes_work_the_same_on_a_partitioned_table(self):
+        partitioning.convert(connection, 4)
+        self.assertEqual(4, partitioning.partition_count(connection))
+        self.assertEqual(6, Quote.objects.count())
+
+        res = self.client.get(QUOTES_URLS['list-quote']())
+        self.assertEqual(4, len(res.context_data['quote_list']))
+
+        quote = Quote.objects.create(book=Book.objects.get(pk=2), text="Partitioned", created_by=self.tiny)
+        self.assertGreater(quote.pk, 6)
+        self.client.post(QUOTES_URLS['update-quote'](quote.pk), data={'book': 3, 'text': "Moved", 'page': ''})
+        self.assertEqual(3, Quote.objects.get(pk=quote.pk).book_id)
+
+        partitioning.convert(connection, 0)
+        self.assertEqual(0, partitioning.partition_count(connection))
+        self.assertEqual(7, Quote.objects.count())
+
+    def test_failed_conversion_leaves_the_table_as_it_was(self):
+        def fail_while_copying(message):
+            if message.startswith("Copied"):
+                raise RuntimeError("interrupted")
+
+        with self.assertRaises(RuntimeError):
+            partitioning.convert(connection, 4, log=fail_while_copying)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [partitioning.NEW_TABLE])
+            self.assertIsNone(cursor.fetchone()[0])
+        self.assertEqual(0, partitioning.partition_count(connection))
+
+        # writes are no longer mirrored, and converting again works
+        Quote.objects.create(book=Book.objects.get(pk=2), text="Not mirrored", created_by=self.tiny)
+        partitioning.convert(connection, 4)
+        self.assertEqual(7, Quote.objects.count())
+
+    def test_command_skips_a_table_that_is_already_partitioned(self):
+        call_command('partition_quotes', partitions=2, stdout=StringIO())
+        out = StringIO()
+        call_command('partition_quotes', partitions=2, stdout=out)
+        self.assertIn("already has 2 partitions", out.getvalue())
+
+
+class TestDigests(TestCase):
+    fixtures = ['quotes', 'users']
+
+    def setUp(self):
+        self.bigboii = User.objects.get(username="bigboii")
+        self.tiny = User.objects.get(username="tiny")
+        User.objects.filter(pk=self.bigboii.pk).update(email="bigboii@example.com")
+        User.objects.filter(pk=self.tiny.pk).update(email="tiny@example.com")
+        self.period = datetime.date(2019, 10, 21)
+
+    def send_digests(self, *args):
+        out = StringIO()
+        call_command('send_digests', '--date', '2019-10-23', *args, stdout=out)
+        return out.getvalue()
+
+    def outbox(self):
+        return {message.to[0]: message for message in mail.outbox}
+
+    def test_sends_last_weeks_quotes_and_random_older_ones(self):
+        out = self.send_digests()
+        self.assertIn("Sent 2 digests for the week of 2019-10-21.", out)
+
+        tiny = self.outbox()["tiny@example.com"]
+        self.assertEqual("Your quotes for the week of 21 October 2019", tiny.subject)
+        recent, older = tiny.body.split("From your collection:")
+        self.assertIn("Actually it's quite good", recent)
+        self.assertIn("No wait, it definitely sucks", recent)
+        self.assertIn("This book sucks", older)
+        html, _ = tiny.alternatives[0]
+        self.assertIn(f'href="https://example.com{QUOTES_URLS["detail-quote"](4)}"', html)
+        self.assertIn("Actually it&#39;s quite good", html)
+
+        bigboii = self.outbox()["bigboii@example.com"]
+        self.assertNotIn("Quotes you saved last week", bigboii.body)
+        self.assertIn("This is a quote", bigboii.body)
+        self.assertIn("This is another quote", bigboii.body)
+
+    def test_rerunning_skips_digests_already_sent(self):
+        self.send_digests()
+        mail.outbox = []
+        self.assertIn("Sent 0 digests", self.send_digests())
+        self.assertEqual([], mail.outbox)
+        self.assertEqual(2, DigestDelivery.objects.filter(period=self.period, sent__isnull=False).count())
+
+    def test_skips_digests_claimed_by_another_run_until_it_times_out(self):
+        claim = DigestDelivery.objects.create(created_by=self.tiny, period=self.period, claimed_by='other', claimed=timezone.now())
+        self.send_digests()
+        self.assertEqual(["bigboii@example.com"], list(self.outbox()))
+
+        mail.outbox = []
+        claim.claimed = timezone.now() - datetime.timedelta(hours=2)
+        claim.save()
+        self.send_digests()
+        self.assertEqual(["tiny@example.com"], list(self.outbox()))
+
+    def test_shards_split_the_users(self):
+        self.send_digests('--shard', '0/2')
+        self.assertEqual(["tiny@example.com"], list(self.outbox()))
+        self.send_digests('--shard', '1/2')
+        self.assertEqual(["bigboii@example.com", "tiny@example.com"], sorted(self.outbox()))
+
+    def test_users_without_quotes_or_email_get_nothing(self):
+        User.objects.create(username="newbie", email="newbie@example.com")
+        User.objects.filter(pk=self.tiny.pk).update(email="")
+        self.send_digests()
+        self.assertEqual(["bigboii@example.com"], list(self.outbox()))
+
+    def test_picks_the_same_few_older_quotes_on_every_run(self):
+        book = Book.objects.get(pk=3)
+        with freeze_time("2019-09-01"):
+            for i in range(10):
+                Quote.objects.create(book=book, text=f"Old quote {i}", created_by=self.tiny)
+
+        _, picked = digests.select_quotes([self.tiny.id], self.period)[self.tiny.id]
+        self.assertEqual(3, len(picked))
+        _, again = digests.select_quotes([self.tiny.id], self.period)[self.tiny.id]
+        self.assertEqual(picked, again)
+        next_weeks = [digests.select_quotes([self.tiny.id], self.period + datetime.timedelta(weeks=week))[self.tiny.id][1] for week in range(1, 4)]
+        self.assertTrue(any(set(picks) != set(picked) for picks in next_weeks))
+
+    def test_keeps_only_the_latest_quotes_of_the_week(self):
+        book = Book.objects.get(pk=3)
+        for day in range(14, 21):
+            with freeze_time(f"2019-10-{day} 12:00"):
+                Quote.objects.create(book=book, text=f"Quote of the {day}th", created_by=self.tiny)
+
+        recent, _ = digests.select_quotes([self.tiny.id], self.period, recent_count=3)[self.tiny.id]
+        self.assertEqual(["Quote of the 20th", "Quote of the 19th", "Quote of the 18th"], [quote.text for quote in recent])
+
+    def test_queries_depend_on_chunks_not_users(self):
+        book = Book.objects.get(pk=3)
+        # the current site is cached after the first run
+        Site.objects.get_current()
+        with CaptureQueriesContext(connection) as few:
+            digests.send_digests(self.period, chunk_size=50)
+        with freeze_time("2019-10-22"):
+            for i in range(10):
+                user = User.objects.create(username=f"reader{i}", email=f"reader{i}@example.com")
+                Quote.objects.create(book=book, text=f"Quote {i}", created_by=user)
+        with CaptureQueriesContext(connection) as many:
+            digests.send_digests(self.period + datetime.timedelta(days=7), chunk_size=50)
+        self.assertEqual(12, len(mail.outbox) - 2)
+        self.assertEqual(len(few), len(many))
@@ -6,6 +6,8 @@ app_name = 'quotes'
 urlpatterns = [
     path('quotes/', views.ListQuoteView.as_view(), name='list-quote'),
     path('quotes/new', views.NewQuoteView.as_view(), name='new-quote'),
+    path('quotes/bulk', views.BulkQuoteView.as_view(), name='bulk-quote'),
+    path('quotes/search', views.SearchQuoteView.as_view(), name='search-quote'),
     path('quotes/<int:pk>', views.DetailQuoteView.as_view(), name='detail-quote'),
     path('quotes/<int:pk>/update', views.UpdateQuoteView.as_view(), name='update-quote'),
     path('quotes/<int:pk>/delete', views.DeleteQuoteView.as_view(), name='delete-quote'),
@@ -14,4 +16,7 @@ urlpatterns = [
     path('books/<int:pk>', views.DetailBookView.as_view(), name='detail-book'),
     path('books/<int:pk>/update', views.UpdateBookView.as_view(), name='update-book'),
     path('books/<int:pk>/delete', views.DeleteBookView.as_view(), name='delete-book'),
+    path('authors/', views.ListAuthorView.as_view(), name='list-author'),
+    path('authors/<int:pk>', views.DetailAuthorView.as_view(), name='detail-author'),
+    path('stats/', views.StatsView.as_view(), name='stats'),
 ]
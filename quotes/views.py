@@ -1,36 +1,130 @@
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
 from django.forms import ModelChoiceField
-from django.urls import reverse_lazy
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from django.urls import reverse, reverse_lazy
+from django.utils.text import Truncator
+from django.utils.http import is_safe_url
 from django.views import generic
 
-from .models import Quote, Book
-from .forms import QuoteSearchForm
+from . import bulk, search, stats
+from .models import Author, Quote, Book
+from .forms import BookForm, BulkQuoteForm, QuoteSearchForm
 
 
 class IndexView(generic.base.TemplateView):
     template_name = 'quotr/index.html'
 
-class ListQuoteView(LoginRequiredMixin, generic.ListView):
+class FragmentListMixin:
+    # With ?fragment=1 only the cards of the requested page are rendered,
+    # without the surrounding layout, and the URL of the next page is sent
+    # in the X-Next-Page header. Used by quotes/infinite_scroll.js.
+    fragment_template_name = None
+    # Lists in this order continue after the last card shown, with
+    # ?after=<its values of these fields>, rather than at an offset, so that
+    # cards added, edited or deleted while scrolling don't shift the next
+    # page. Other orders, like search results by rank, use ?page=N.
+    cursor_ordering = None
+
+    def is_fragment(self):
+        return 'fragment' in self.request.GET
+
+    def get_template_names(self):
+        if self.is_fragment():
+            return [self.fragment_template_name]
+        return super().get_template_names()
+
+    def uses_cursor(self, queryset):
+        return self.cursor_ordering is not None and tuple(queryset.query.order_by) == self.cursor_ordering
+
+    def filter_after(self, queryset, cursor):
+        # the last value is the id, the ones before it can't contain commas
+        values = cursor.rsplit(',', len(self.cursor_ordering) - 1)
+        if len(values) != len(self.cursor_ordering):
+            raise Http404("Invalid cursor.")
+        fields = [name.lstrip('-') for name in self.cursor_ordering]
+        try:
+            values = [queryset.model._meta.get_field(name).to_python(value) for name, value in zip(fields, values)]
+        except ValidationError:
+            raise Http404("Invalid cursor.")
+
+        # (a, b) after (x, y) in the list: a beyond x, or a = x and b beyond y
+        after = Q()
+        for i, name in enumerate(self.cursor_ordering):
+            lookup = f"{fields[i]}__{'lt' if name.startswith('-') else 'gt'}"
+            after |= Q(**dict(zip(fields[:i], values[:i])), **{lookup: values[i]})
+        return queryset.filter(after)
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.request.GET.get('after') and self.uses_cursor(queryset):
+            queryset = self.filter_after(queryset, self.request.GET['after'])
+        return super().paginate_queryset(queryset, page_size)
+
+    def get_next_page_url(self, page_obj):
+        if page_obj is None or not page_obj.has_next():
+            return None
+        params = self.request.GET.copy()
+        params.pop('fragment', None)
+        if self.uses_cursor(page_obj.object_list):
+            params.pop('page', None)
+            last = page_obj.object_list[len(page_obj) - 1]
+            params['after'] = ','.join(str(getattr(last, name.lstrip('-'))) for name in self.cursor_ordering)
+        else:
+            params['page'] = page_obj.next_page_number()
+        return f"{self.request.path}?{params.urlencode()}"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_page_url'] = self.get_next_page_url(context.get('page_obj'))
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        if self.is_fragment() and context['next_page_url']:
+            response['X-Next-Page'] = context['next_page_url']
+        return response
+
+class ListQuoteView(LoginRequiredMixin, FragmentListMixin, generic.ListView):
     paginate_by = 20
+    cursor_ordering = ('-modified', '-id')
+    fragment_template_name = 'quotes/_quote_cards.html'
 
     def get_queryset(self):
-        quotes = Quote.objects.filter(created_by=self.request.user).order_by('-modified')
+        quotes = Quote.objects.filter(created_by=self.request.user).select_related('book__author').defer('search_vector').order_by('-modified', '-id')
         if 'search' in self.request.GET and self.request.GET['search']:
-            query = SearchQuery(self.request.GET['search'])
-            vector = SearchVector('text', 'book__title', 'book__author')
-            quotes = quotes.annotate(search=vector, rank=SearchRank(vector, query)).filter(search=self.request.GET['search']).order_by('-rank')
+            quotes = search.get_backend().search(quotes, self.request.GET['search'])
 
         return quotes
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['search_form'] = QuoteSearchForm(self.request.GET)
+        context['bulk_form'] = BulkQuoteForm(user=self.request.user)
         return context
+
+class SearchQuoteView(LoginRequiredMixin, generic.View):
+    # The best few matches as JSON, for quotes/live_search.js
+    limit = 8
+
+    def get(self, request):
+        query = request.GET.get('search', '')
+        results = []
+        if query.strip():
+            quotes = search.get_backend().search(Quote.objects.filter(created_by=request.user), query)
+            for row in quotes.values('id', 'text', 'book__title', 'book__author__name')[:self.limit]:
+                results.append({
+                    'text': Truncator(row['text']).chars(200),
+                    'book': row['book__title'],
+                    'author': row['book__author__name'],
+                    'url': reverse('quotes:detail-quote', args=(row['id'],)),
+                })
+        return JsonResponse({'search': query, 'results': results})
     
 class DetailQuoteView(LoginRequiredMixin, generic.DetailView):
     def get_queryset(self):
-        return Quote.objects.filter(created_by=self.request.user)
+        return Quote.objects.filter(created_by=self.request.user).select_related('book__author')
 
 class NewQuoteView(LoginRequiredMixin, generic.CreateView):
     model = Quote
@@ -40,7 +134,7 @@ class NewQuoteView(LoginRequiredMixin, generic.CreateView):
         form = super().get_form(form_class=form_class)
         form.instance.created_by = self.request.user
         
-        form.fields['book'] = ModelChoiceField(queryset=Book.objects.filter(created_by=self.request.user).order_by('-modified'))
+        form.fields['book'] = ModelChoiceField(queryset=Book.objects.filter(created_by=self.request.user).select_related('author').order_by('-modified'))
 
         return form
 
@@ -49,7 +143,7 @@ class UpdateQuoteView(LoginRequiredMixin, generic.UpdateView):
     
     def get_form(self, form_class=None):
         form = super().get_form(form_class=form_class)
-        form.fields['book'] = ModelChoiceField(queryset=Book.objects.filter(created_by=self.request.user).order_by('-modified'))
+        form.fields['book'] = ModelChoiceField(queryset=Book.objects.filter(created_by=self.request.user).select_related('author').order_by('-modified'))
 
         return form
     
@@ -62,40 +156,119 @@ class DeleteQuoteView(LoginRequiredMixin, generic.DeleteView):
     def get_queryset(self):
         return Quote.objects.filter(created_by=self.request.user)
 
+class BulkQuoteView(LoginRequiredMixin, generic.FormView):
+    # Applies one action to many quotes at once, as a single UPDATE or DELETE
+    http_method_names = ['post']
+    form_class = BulkQuoteForm
+    template_name = 'quotes/quote_confirm_bulk_delete.html'
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        return kwargs
 
+    def redirect_url(self, form):
+        url = form.data.get('next')
+        if url and is_safe_url(url, allowed_hosts={self.request.get_host()}, require_https=self.request.is_secure()):
+            return url
+        return reverse_lazy('quotes:list-quote')
 
-class ListBookView(LoginRequiredMixin, generic.ListView):
+    def form_valid(self, form):
+        quotes = Quote.objects.filter(created_by=self.request.user, pk__in=form.cleaned_data['quotes'])
+        if form.cleaned_data['action'] == BulkQuoteForm.MOVE:
+            book = form.cleaned_data['book']
+            count = bulk.move_quotes(quotes, book)
+            messages.success(self.request, f"Moved {count} quote{'s' if count != 1 else ''} to {book.title}.")
+        elif not form.cleaned_data['confirm']:
+            # like a single delete, ask first on a page of its own
+            ids = list(quotes.values_list('pk', flat=True))
+            return self.render_to_response(self.get_context_data(form=form, quote_ids=ids, count=len(ids)))
+        else:
+            count = bulk.delete_quotes(quotes)
+            messages.success(self.request, f"Deleted {count} quote{'s' if count != 1 else ''}.")
+        return HttpResponseRedirect(self.redirect_url(form))
+
+    def form_invalid(self, form):
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(self.request, error)
+        return HttpResponseRedirect(self.redirect_url(form))
+
+
+
+class ListBookView(LoginRequiredMixin, FragmentListMixin, generic.ListView):
     paginate_by = 20
-    ordering = '-modified'
+    cursor_ordering = ('-modified', '-id')
+    fragment_template_name = 'quotes/_book_cards.html'
 
     def get_queryset(self):
-        return Book.objects.filter(created_by=self.request.user)
+        return Book.objects.filter(created_by=self.request.user).select_related('author').order_by('-modified', '-id')
     
 class DetailBookView(LoginRequiredMixin, generic.DetailView):
     def get_queryset(self):
-        return Book.objects.filter(created_by=self.request.user)
+        return Book.objects.filter(created_by=self.request.user).select_related('author')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['quotes'] = Quote.objects.filter(book=self.get_object())
+        context['quotes'] = Quote.objects.filter(book=self.object).select_related('book__author')
+        context['bulk_form'] = BulkQuoteForm(user=self.request.user)
         return context
 
-class NewBookView(LoginRequiredMixin, generic.CreateView):
+class BookFormMixin:
+    form_class = BookForm
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        return kwargs
+
+class NewBookView(LoginRequiredMixin, BookFormMixin, generic.CreateView):
     model = Book
-    fields = ['title', 'author']
 
     def form_valid(self, form):
         form.instance.created_by = self.request.user
         return super().form_valid(form)
 
-class UpdateBookView(LoginRequiredMixin, generic.UpdateView):
-    fields = ['title', 'author']
-
+class UpdateBookView(LoginRequiredMixin, BookFormMixin, generic.UpdateView):
     def get_queryset(self):
-        return Book.objects.filter(created_by=self.request.user)
+        return Book.objects.filter(created_by=self.request.user).select_related('author')
 
 class DeleteBookView(LoginRequiredMixin, generic.DeleteView):
     success_url = reverse_lazy('quotes:list-book')
 
     def get_queryset(self):
         return Book.objects.filter(created_by=self.request.user)
+
+    def delete(self, request, *args, **kwargs):
+        response = super().delete(request, *args, **kwargs)
+        Author.objects.filter(pk=self.object.author_id).unused().delete()
+        return response
+
+
+class ListAuthorView(LoginRequiredMixin, FragmentListMixin, generic.ListView):
+    paginate_by = 20
+    fragment_template_name = 'quotes/_author_cards.html'
+    cursor_ordering = ('normalized_name', 'id')
+
+    def get_queryset(self):
+        return Author.objects.filter(created_by=self.request.user).annotate(
+            book_count=Count('books')
+        ).filter(book_count__gt=0).order_by('normalized_name', 'id')
+
+class DetailAuthorView(LoginRequiredMixin, generic.DetailView):
+    def get_queryset(self):
+        return Author.objects.filter(created_by=self.request.user).exclude(pk__in=Author.objects.unused())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['books'] = self.object.books.select_related('author').order_by('-modified', '-id')
+        return context
+
+
+class StatsView(LoginRequiredMixin, generic.base.TemplateView):
+    template_name = 'quotes/stats.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(stats.summary(self.request.user))
+        return context
@@ -0,0 +1,106 @@
+"""PostgreSQL with a pool of connections per worker process.
+
+Closing a connection, which Django does at the end of every request unless
+CONN_MAX_AGE keeps it open, hands it back to the pool of the process instead,
+and the next request of any thread checks it out again. Requests no longer
+pay for connecting and authenticating, and the number of connections to the
+database is bounded by the pool size. Enabled with DATABASE_POOL=1, see
+quotr.settings for the options.
+"""
+import os
+import threading
+
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from quotr.db.pool import ConnectionPool, PoolTimeout
+
+Database = base.Database
+
+DEFAULT_POOL_OPTIONS = {
+    'MAX_SIZE': 10,
+    'MAX_LIFETIME': 1800,
+    'MAX_IDLE': 300,
+    'CHECK_INTERVAL': 30,
+    'TIMEOUT': 10,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(conn_params, options):
+    # forked workers must not share the connections of their parent
+    key = (os.getpid(), tuple(sorted((name, repr(value)) for name, value in conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            options = {**DEFAULT_POOL_OPTIONS, **options}
+            _pools[key] = ConnectionPool(
+                lambda: Database.connect(**conn_params),
+                max_size=options['MAX_SIZE'],
+                max_lifetime=options['MAX_LIFETIME'],
+                max_idle=options['MAX_IDLE'],
+                check_interval=options['CHECK_INTERVAL'],
+                timeout=options['TIMEOUT'],
+            )
+        return _pools[key]
+
+
+def close_pools(database=None):
+    """Close the pooled connections of this process, optionally only the ones
+    to `database`."""
+    with _pools_lock:
+        pools = [
+            pool for (pid, params), pool in _pools.items()
+            if pid == os.getpid() and (database is None or ('database', repr(database)) in params)
+        ]
+    for pool in pools:
+        pool.close()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # idle pooled connections would keep the database from being dropped
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(conn_params, self.settings_dict.get('POOL', {}))
+        try:
+            connection = self.pool.acquire()
+        except PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e
+
+        # as in the base class, before autocommit is turned on
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # Django keeps using a connection closed in an atomic block until the
+        # block exits, so that one can't be handed to anybody else
+        reusable = not self.in_atomic_block and self._reset(self.connection)
+        with self.wrap_database_errors:
+            self.pool.release(self.connection, reusable)
+
+    def _reset(self, connection):
+        """Leave the connection as the next user expects to find it, and tell
+        if that worked."""
+        if connection.closed:
+            return False
+        try:
+            if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            return True
+        except Database.Error:
+            return False
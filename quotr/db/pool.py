@@ -0,0 +1,161 @@
+import collections
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of DB-API connections.
+
+    At most `max_size` connections are open at a time, and acquire() waits up
+    to `timeout` seconds for one to be released when they are all in use.
+    Connections are closed instead of reused once they are older than
+    `max_lifetime` or have been idle for longer than `max_idle` seconds, and
+    are checked with `check(connection)` before being handed out again after
+    `check_interval` seconds of idleness."""
+
+    def __init__(self, connect, max_size=10, max_lifetime=1800, max_idle=300, check_interval=30, timeout=10, check=None):
+        self._connect = connect
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self._check = check or _select_one
+
+        self._lock = threading.Condition()
+        # (connection, opened, last used), most recently used last
+        self._idle = collections.deque()
+        # id(connection) -> (opened, generation) of every open connection
+        self._open = {}
+        self._opening = 0
+        self._generation = 0
+        self.stats = collections.Counter()
+
+    def __len__(self):
+        return len(self._open)
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                connection, idle = self._take_idle()
+                if connection is None:
+                    if len(self._open) + self._opening >= self.max_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise PoolTimeout(f"All {self.max_size} connections are in use.")
+                        self.stats['waits'] += 1
+                        self._lock.wait(remaining)
+                        continue
+                    # the slot is taken now, the connection is opened outside the lock
+                    self._opening += 1
+
+            if connection is not None:
+                # checked outside the lock as well, it is a round trip
+                if idle <= self.check_interval or self._healthy(connection):
+                    with self._lock:
+                        self.stats['reused'] += 1
+                    return connection
+                continue
+            return self._open_new()
+
+    def _take_idle(self):
+        self._sweep()
+        if not self._idle:
+            return None, None
+        connection, _, last_used = self._idle.pop()
+        return connection, time.monotonic() - last_used
+
+    def _sweep(self):
+        # Connections are taken from the most recently used end, so the ones
+        # at the other end would never be looked at under light load. All of
+        # them are checked instead, there are at most max_size.
+        now = time.monotonic()
+        fresh = collections.deque()
+        for connection, opened, last_used in self._idle:
+            if now - opened > self.max_lifetime or now - last_used > self.max_idle:
+                self._forget(connection)
+                _close(connection)
+            else:
+                fresh.append((connection, opened, last_used))
+        if len(fresh) != len(self._idle):
+            self._idle = fresh
+            self._lock.notify_all()
+
+    def _open_new(self):
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._lock:
+                self._opening -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._opening -= 1
+            self._open[id(connection)] = (time.monotonic(), self._generation)
+            self.stats['opened'] += 1
+        return connection
+
+    def _healthy(self, connection):
+        try:
+            self._check(connection)
+            return True
+        except Exception:
+            with self._lock:
+                self.stats['failed_checks'] += 1
+                self._forget(connection)
+                self._lock.notify()
+            _close(connection)
+            return False
+
+    def _forget(self, connection):
+        self._open.pop(id(connection), None)
+        self.stats['closed'] += 1
+
+    def release(self, connection, reusable=True):
+        """Give a connection back, or close it when it is not `reusable`."""
+        with self._lock:
+            opened, generation = self._open.get(id(connection), (None, None))
+            if opened is None:
+                # not one of ours (anymore)
+                reusable = False
+            elif not reusable or generation != self._generation or time.monotonic() - opened > self.max_lifetime:
+                self._forget(connection)
+                reusable = False
+            else:
+                self._idle.append((connection, opened, time.monotonic()))
+            self._sweep()
+            self._lock.notify()
+        if not reusable:
+            _close(connection)
+
+    def close(self):
+        """Close the idle connections, and the ones in use once released."""
+        with self._lock:
+            self._generation += 1
+            idle, self._idle = self._idle, collections.deque()
+            for connection, _, _ in idle:
+                self._forget(connection)
+            self._lock.notify_all()
+        for connection, _, _ in idle:
+            _close(connection)
+
+
+def _select_one(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def _close(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
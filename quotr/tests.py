@@ -0,0 +1,179 @@
+import sqlite3
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+
+from .db.backends.postgresql import base
+from .db.pool import ConnectionPool, PoolTimeout
+
+
+class TestConnectionPool(SimpleTestCase):
+    def pool(self, **kwargs):
+        return ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), **kwargs)
+
+    def test_reuses_released_connections(self):
+        pool = self.pool()
+        connection = pool.acquire()
+        pool.release(connection)
+
+        self.assertIs(connection, pool.acquire())
+        self.assertEqual(1, pool.stats['opened'])
+        self.assertEqual(1, pool.stats['reused'])
+
+    def test_is_bounded(self):
+        pool = self.pool(max_size=2, timeout=0.05)
+        pool.acquire(), pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(2, len(pool))
+
+    def test_waiting_threads_get_released_connections(self):
+        pool = self.pool(max_size=1, timeout=5)
+        connection = pool.acquire()
+        acquired = []
+        waiting = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        waiting.start()
+
+        pool.release(connection)
+        waiting.join()
+        self.assertEqual([connection], acquired)
+        self.assertEqual(1, pool.stats['opened'])
+
+    def test_replaces_connections_failing_the_health_check(self):
+        pool = self.pool(check_interval=-1)
+        connection = pool.acquire()
+        pool.release(connection)
+        # e.g. the database server restarted in the meantime
+        connection.close()
+
+        replacement = pool.acquire()
+        self.assertIsNot(connection, replacement)
+        replacement.execute('SELECT 1')
+        self.assertEqual(1, pool.stats['failed_checks'])
+        self.assertEqual(1, len(pool))
+
+    def test_recently_used_connections_are_not_checked(self):
+        checked = []
+        pool = self.pool(check=checked.append)
+        pool.release(pool.acquire())
+        pool.acquire()
+        self.assertEqual([], checked)
+
+    def test_closes_connections_past_their_lifetime_or_idle_for_too_long(self):
+        for options in [{'max_lifetime': -1}, {'max_idle': -1}]:
+            pool = self.pool(**options)
+            connection = pool.acquire()
+            pool.release(connection)
+
+            self.assertIsNot(connection, pool.acquire())
+            self.assertEqual(2, pool.stats['opened'])
+            self.assertEqual(1, len(pool))
+
+    def test_closes_expired_connections_that_are_not_next_in_line(self):
+        pool = self.pool(max_idle=0.05)
+        older, newer = pool.acquire(), pool.acquire()
+        pool.release(older)
+        time.sleep(0.1)
+        pool.release(newer)
+
+        # releasing sweeps the connection that has been idle for too long
+        with self.assertRaises(sqlite3.ProgrammingError):
+            older.execute('SELECT 1')
+        self.assertIs(newer, pool.acquire())
+        self.assertEqual(1, len(pool))
+
+    def test_broken_connections_are_not_reused(self):
+        pool = self.pool()
+        connection = pool.acquire()
+        pool.release(connection, reusable=False)
+
+        self.assertIsNot(connection, pool.acquire())
+        with self.assertRaises(sqlite3.ProgrammingError):
+            connection.execute('SELECT 1')
+
+    def test_close_closes_idle_connections_and_the_rest_once_released(self):
+        pool = self.pool()
+        idle, in_use = pool.acquire(), pool.acquire()
+        pool.release(idle)
+
+        pool.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            idle.execute('SELECT 1')
+        in_use.execute('SELECT 1')
+
+        pool.release(in_use)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            in_use.execute('SELECT 1')
+        self.assertEqual(0, len(pool))
+
+    def test_failed_connects_free_their_slot(self):
+        attempts = []
+
+        def connect():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise sqlite3.OperationalError("unable to connect")
+            return sqlite3.connect(':memory:')
+
+        pool = ConnectionPool(connect, max_size=1, timeout=0.05)
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.acquire()
+        pool.acquire()
+        self.assertEqual(1, len(pool))
+
+
+class TestPooledDatabaseWrapper(SimpleTestCase):
+    def setUp(self):
+        self.wrapper = base.DatabaseWrapper({
+            'NAME': 'quotr_pool_test', 'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '', 'OPTIONS': {},
+            'POOL': {'MAX_SIZE': 2},
+        })
+        self.addCleanup(base.close_pools, 'quotr_pool_test')
+        connect = mock.patch.object(base.Database, 'connect', side_effect=lambda **params: self.fake_connection())
+        connect.start()
+        self.addCleanup(connect.stop)
+
+    def fake_connection(self, status=extensions.TRANSACTION_STATUS_IDLE):
+        connection = mock.Mock(closed=0, isolation_level=None)
+        connection.get_transaction_status.return_value = status
+        return connection
+
+    def connect(self):
+        self.wrapper.connection = self.wrapper.get_new_connection(self.wrapper.get_connection_params())
+        return self.wrapper.connection
+
+    def test_closing_hands_the_connection_to_the_next_user(self):
+        connection = self.connect()
+        self.wrapper._close()
+
+        self.assertIs(connection, self.connect())
+        connection.close.assert_not_called()
+        self.assertEqual(1, self.wrapper.pool.stats['reused'])
+
+    def test_connections_closed_in_an_atomic_block_are_not_reused(self):
+        connection = self.connect()
+        self.wrapper.in_atomic_block = True
+        self.wrapper._close()
+        self.wrapper.in_atomic_block = False
+
+        connection.close.assert_called_once_with()
+        self.assertIsNot(connection, self.connect())
+
+    def test_reset_rolls_back_open_transactions(self):
+        connection = self.fake_connection(extensions.TRANSACTION_STATUS_INTRANS)
+        self.assertTrue(self.wrapper._reset(connection))
+        connection.rollback.assert_called_once_with()
+
+        connection = self.fake_connection()
+        self.assertTrue(self.wrapper._reset(connection))
+        connection.rollback.assert_not_called()
+
+    def test_reset_fails_for_closed_or_broken_connections(self):
+        self.assertFalse(self.wrapper._reset(mock.Mock(closed=1)))
+
+        connection = self.fake_connection(extensions.TRANSACTION_STATUS_INERROR)
+        connection.rollback.side_effect = base.Database.OperationalError("server closed the connection")
+        self.assertFalse(self.wrapper._reset(connection))